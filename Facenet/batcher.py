@@ -0,0 +1,134 @@
+import threading, queue, time
+from concurrent.futures import Future
+import numpy as np
+from utils_facenet import embed_face_tensors
+
+class EmbeddingBatcher:
+    # Kumpulkan wajah dari banyak thread/request, lalu jalankan SATU forward pass.
+    # Batch dikirim jika sudah max_batch wajah atau max_wait_ms sejak wajah pertama.
+    def __init__(self, max_batch=16, max_wait_ms=5):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.faces = 0
+        self._stop = False
+        # close() dan submit() saling mengunci: tidak ada wajah yang masuk
+        # antrian setelah sentinel penutup, jadi semua future pasti diselesaikan
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, face_tensor):
+        # Return Future berisi embedding (512,) untuk satu wajah ter-align
+        future = Future()
+        if face_tensor is None:
+            future.set_result(None)
+            return future
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Batcher sudah ditutup")
+            self.queue.put((face_tensor, future))
+        return future
+
+    def embed(self, face_tensor, timeout=None):
+        # Versi blocking dari submit()
+        return self.submit(face_tensor).result(timeout)
+
+    def _collect(self):
+        item = self.queue.get()
+        if item is None:
+            return None
+        items = [item]
+        deadline = time.perf_counter() + self.max_wait
+        while len(items) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._stop = True
+                break
+            items.append(item)
+        return items
+
+    def _loop(self):
+        while True:
+            items = self._collect()
+            if items is None:
+                break
+            # Caller yang sudah membatalkan future tidak ikut dihitung
+            items = [(t, f) for t, f in items if f.set_running_or_notify_cancel()]
+            if items:
+                try:
+                    embs = embed_face_tensors([t for t, _ in items])
+                    for (_, future), emb in zip(items, embs):
+                        future.set_result(emb)
+                except Exception as e:
+                    for _, future in items:
+                        future.set_exception(e)
+                self.batches += 1
+                self.faces += len(items)
+            if self._stop:
+                break
+
+    def close(self):
+        # Wajah yang sudah di-submit sebelum close tetap diproses
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self.queue.put(None)
+        self._thread.join()
+        # Wajah yang masih mengantri setelah batcher berhenti
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(RuntimeError("Batcher sudah ditutup"))
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def get_batcher():
+    # Batcher bersama untuk jalur prediksi satu gambar (predict_one.predict_image),
+    # dibuat saat pertama dipakai supaya import modul ini tidak memulai thread / memuat torch
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = EmbeddingBatcher()
+    return _shared
+
+if __name__ == "__main__":
+    # Bandingkan: 1 wajah per forward vs micro-batching dari banyak thread
+    from concurrent.futures import ThreadPoolExecutor
+    import torch
+    from utils_facenet import embed_face_tensor
+
+    n_faces, n_threads = 64, 16
+    faces = [torch.randn(3, 160, 160) for _ in range(n_faces)]
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(n_threads) as pool:
+        single = list(pool.map(embed_face_tensor, faces))
+    t_single = time.perf_counter() - t0
+
+    batcher = EmbeddingBatcher(max_batch=16, max_wait_ms=5)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(n_threads) as pool:
+        batched = list(pool.map(batcher.embed, faces))
+    t_batch = time.perf_counter() - t0
+    batcher.close()
+
+    diff = max(float(np.abs(a - b).max()) for a, b in zip(single, batched))
+    print(f"Satu per satu : {n_faces / t_single:.1f} wajah/detik")
+    print(f"Micro-batching: {n_faces / t_batch:.1f} wajah/detik "
+          f"({batcher.batches} batch, rata-rata {batcher.faces / batcher.batches:.1f} wajah)")
+    print("Selisih embedding maks:", diff)
@@ -1,6 +1,8 @@
-import os, glob, numpy as np
+import os, glob, time, threading, queue, argparse
 from tqdm import tqdm
-from utils_facenet import embed_from_path
+from utils_facenet import read_img_bgr, bgr_to_pil, get_mtcnn, embed_face_tensors, MODEL_VERSION
+from embedding_cache import EmbeddingCache
+from embedding_store import EmbeddingWriter
 
 def iter_images(root):
     classes = sorted([
@@ -11,23 +13,224 @@ def iter_images(root):
         for p in glob.glob(os.path.join(root, cls, "*")):
             yield p, cls
 
-def build_matrix(root):
-    X, y, bad = [], [], []
-    for path, cls in tqdm(list(iter_images(root))):
-        emb = embed_from_path(path)
-        if emb is None:
-            bad.append(path)
-            continue
-        X.append(emb)
-        y.append(cls)
-    return np.array(X), np.array(y), bad
+class StageStats:
+    # Jumlah item & waktu kerja (tanpa waktu menunggu antrian) per tahap
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, items, seconds):
+        with self.lock:
+            self.items += items
+            self.busy += seconds
+
+    def report(self, workers=1):
+        rate = self.items / self.busy * workers if self.busy > 0 else 0.0
+        return f"{self.name:<7}: {self.items:6d} item, {rate:8.1f} item/detik per tahap"
+
+_DONE = object()
+
+def build_matrix(root, writer, workers=4, detect_batch=16, embed_batch=32, queue_size=64,
+                 stats=None, cache=None):
+    """
+    Pipeline: decode (thread pool) -> MTCNN per batch ukuran gambar sama ->
+    embedding per batch. Antar tahap dipakai queue terbatas (queue_size),
+    jadi memori tetap kecil walau arsip foto sangat besar.
+    Setiap embedding langsung ditulis ke `writer` (EmbeddingWriter, memmap di disk);
+    file yang sudah tercatat di checkpoint writer dilewati.
+    Dengan `cache` (EmbeddingCache), hanya file baru / berubah yang masuk pipeline.
+    Return (jumlah baris baru, daftar file gagal).
+    """
+    stats = stats if stats is not None else {}
+    for name in ("decode", "detect", "embed"):
+        stats[name] = StageStats(name)
+
+    paths = queue.Queue(maxsize=queue_size)
+    decoded = queue.Queue(maxsize=queue_size)
+    faces = queue.Queue(maxsize=queue_size)
+    bad = []
+    errors = []
+    seen = []
+    written = 0
+    write_lock = threading.Lock()
+
+    def write(path, cls, emb):
+        nonlocal written
+        with write_lock:
+            writer.append(path, cls, emb)
+            written += 1
+
+    def feed():
+        try:
+            for path, cls in iter_images(root):
+                seen.append(path)
+                if path in writer.done:
+                    # Sudah ditulis sebelum build terputus: embedding-nya jangan ikut di-prune
+                    if cache is not None:
+                        cache.keep(path)
+                    continue
+                key = None
+                if cache is not None:
+                    key = cache.key(path)
+                    found, emb = cache.lookup(key)
+                    if found:
+                        if emb is None:
+                            bad.append(path)
+                        else:
+                            write(path, cls, emb)
+                        continue
+                paths.put((path, cls, key))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            for _ in range(workers):
+                paths.put(_DONE)
+
+    def decode():
+        while True:
+            item = paths.get()
+            if item is _DONE:
+                decoded.put(_DONE)
+                return
+            path, cls, key = item
+            t0 = time.perf_counter()
+            try:
+                img = bgr_to_pil(read_img_bgr(path))
+            except Exception:
+                img = None
+            stats["decode"].add(1, time.perf_counter() - t0)
+            if img is None:
+                bad.append(path)
+            else:
+                decoded.put((path, cls, key, img))
+
+    def detect():
+        # MTCNN batch hanya bisa untuk gambar berukuran sama -> kelompokkan per ukuran
+        groups = {}
+        pending = 0
+
+        def flush(size):
+            nonlocal pending
+            group = groups.pop(size)
+            pending -= len(group)
+            t0 = time.perf_counter()
+            aligned = get_mtcnn()([img for _, _, _, img in group])
+            stats["detect"].add(len(group), time.perf_counter() - t0)
+            for (path, cls, key, _), face in zip(group, aligned):
+                if face is None:
+                    bad.append(path)
+                    if cache is not None:
+                        cache.put(key, None)
+                else:
+                    faces.put((path, cls, key, face))
+
+        finished = 0
+        try:
+            while finished < workers:
+                item = decoded.get()
+                if item is _DONE:
+                    finished += 1
+                    continue
+                size = item[3].size
+                groups.setdefault(size, []).append(item)
+                pending += 1
+                if len(groups[size]) >= detect_batch:
+                    flush(size)
+                elif pending >= 2 * detect_batch:
+                    # Terlalu banyak ukuran berbeda tertahan: proses kelompok terbesar
+                    flush(max(groups, key=lambda s: len(groups[s])))
+            for size in list(groups):
+                flush(size)
+        except Exception as e:
+            errors.append(e)
+            # Kosongkan antrian supaya tahap decode tidak macet
+            while finished < workers:
+                if decoded.get() is _DONE:
+                    finished += 1
+        finally:
+            faces.put(_DONE)
+
+    threads = [threading.Thread(target=feed, daemon=True), threading.Thread(target=detect, daemon=True)]
+    threads += [threading.Thread(target=decode, daemon=True) for _ in range(workers)]
+    for t in threads:
+        t.start()
+
+    # Tahap embedding berjalan di thread utama
+    batch = []
+    progress = tqdm(unit="img")
+
+    def embed(batch):
+        t0 = time.perf_counter()
+        embs = embed_face_tensors([face for _, _, _, face in batch])
+        stats["embed"].add(len(batch), time.perf_counter() - t0)
+        for (path, cls, key, _), emb in zip(batch, embs):
+            # Masuk cache dulu: write() bisa memicu checkpoint yang menyimpan cache
+            if cache is not None:
+                cache.put(key, emb)
+            write(path, cls, emb)
+        progress.update(len(batch))
+
+    while True:
+        item = faces.get()
+        if item is _DONE:
+            break
+        batch.append(item)
+        if len(batch) >= embed_batch:
+            embed(batch)
+            batch = []
+    if batch:
+        embed(batch)
+    progress.close()
+
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+
+    if cache is not None:
+        stats["pruned"] = cache.prune(seen)
+    return written, sorted(bad)
 
 if __name__ == "__main__":
-    X, y, bad = build_matrix("data/train")
+    parser = argparse.ArgumentParser(description="Bangun embedding FaceNet dari folder dataset")
+    parser.add_argument("--root", default="data/train")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--detect-batch", type=int, default=16)
+    parser.add_argument("--embed-batch", type=int, default=32)
+    parser.add_argument("--cache", default="embedding_cache.json",
+                        help="File meta cache embedding (matrix-nya di embedding_cache.<gen>.npy)")
+    parser.add_argument("--no-cache", action="store_true", help="Hitung ulang semua embedding")
+    parser.add_argument("--out-dir", default=".", help="Folder X_train.npy, y_train.npy, classes.json")
+    parser.add_argument("--checkpoint-every", type=int, default=1024, help="Checkpoint tiap N baris")
+    parser.add_argument("--fresh", action="store_true", help="Abaikan checkpoint build yang terputus")
+    args = parser.parse_args()
 
-    print("Embeddings:", X.shape)
-    print("Labels:", y.shape)
-    print("Gagal deteksi:", len(bad))
+    cache = None if args.no_cache else EmbeddingCache(args.cache, MODEL_VERSION)
+    # Cache ikut disimpan di setiap checkpoint, supaya baris yang sudah ditulis
+    # sebelum build terputus tetap bisa dipakai ulang lewat cache
+    writer = EmbeddingWriter(args.out_dir, checkpoint_every=args.checkpoint_every,
+                             model_version=MODEL_VERSION, resume=not args.fresh,
+                             on_checkpoint=cache.save if cache is not None else None)
+    if writer.resumed:
+        print(f"Melanjutkan build terputus: {writer.resumed} baris sudah tersimpan")
+
+    stats = {}
+    t0 = time.perf_counter()
+    written, bad = build_matrix(args.root, writer, workers=args.workers, detect_batch=args.detect_batch,
+                                embed_batch=args.embed_batch, stats=stats, cache=cache)
+    elapsed = time.perf_counter() - t0
+    # finalize() menulis checkpoint terakhir, sekaligus menyimpan cache yang sudah di-prune
+    writer.finalize()
 
-    np.save("X_train.npy", X)
-    np.save("y_train.npy", y)
+    if cache is not None:
+        print(f"Cache: {cache.hits} dari cache, {cache.misses} dihitung, {stats['pruned']} dihapus")
+
+    print("Embeddings:", (writer.rows, writer.dim))
+    print("Kelas:", len(writer.classes))
+    print("Gagal deteksi:", len(bad))
+    print(f"Total: {written / elapsed:.1f} img/detik ({elapsed:.1f} detik)")
+    print(stats["decode"].report(args.workers))
+    print(stats["detect"].report())
+    print(stats["embed"].report())
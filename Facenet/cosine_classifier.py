@@ -0,0 +1,215 @@
+import os, io, json
+from contextlib import contextmanager
+import numpy as np
+from utils_facenet import normalize_rows, topk_similar
+
+class CosineClassifier:
+    """
+    Klasifier open-set untuk embedding FaceNet, langsung di ruang cosine.
+    - Galeri = semua embedding training yang sudah dinormalisasi (dot product = cosine)
+    - mode "exemplar": top-k tetangga terdekat, vote berbobot similarity per kelas
+    - mode "centroid": bandingkan dengan rata-rata (centroid) tiap kelas
+    - Wajah dengan similarity terbaik < threshold = UNKNOWN (None)
+    Disimpan sebagai beberapa array .npy berurutan dalam satu file (tanpa pickle),
+    bukan pipeline sklearn; load() hanya membuka memmap, jadi hampir tanpa biaya.
+    Registrasi baru ditambahkan ke <path>.journal (append_journal) tanpa menulis
+    ulang model; load() memutar ulang journal lewat partial_fit_many().
+    """
+
+    FIELDS = ("meta", "gallery", "codes", "sums", "centroids", "classes_")
+    ALIGN = 64
+
+    def __init__(self, k=1, mode="exemplar", threshold=0.7):
+        if mode not in ("exemplar", "centroid"):
+            raise ValueError(f"Mode tidak dikenal: {mode}")
+        self.k = k
+        self.mode = mode
+        self.threshold = threshold
+        self.gallery = None    # (N, 512) float32, ternormalisasi
+        self.codes = None      # (N,) int32 indeks ke classes_
+        self.sums = None       # (C, 512) float32, jumlah embedding per kelas
+        self.centroids = None  # (C, 512) float32, ternormalisasi
+        self.classes_ = None   # (C,) nama kelas
+
+    def fit(self, X, y):
+        self.classes_, self.codes = np.unique(np.asarray(y).astype(str), return_inverse=True)
+        self.codes = self.codes.astype(np.int32)
+        self.gallery = normalize_rows(X)
+        self.sums = np.zeros((len(self.classes_), self.gallery.shape[1]), dtype=np.float32)
+        np.add.at(self.sums, self.codes, self.gallery)
+        self.centroids = normalize_rows(self.sums)
+        return self
+
+    def partial_fit(self, X, label):
+        # Tambah embedding satu identitas tanpa latih ulang: galeri bertambah,
+        # hanya centroid kelas itu yang diperbarui dari jumlah berjalan
+        return self.partial_fit_many([(label, X)])
+
+    def partial_fit_many(self, entries):
+        # Seperti partial_fit untuk banyak [(label, X)] sekaligus (replay journal):
+        # galeri & kelas baru digabung sekali, bukan sekali per entry
+        entries = [(str(label), normalize_rows(np.atleast_2d(X))) for label, X in entries]
+        if not entries:
+            return self
+        dim = entries[0][1].shape[1]
+        if self.gallery is None:
+            self.gallery = np.zeros((0, dim), dtype=np.float32)
+            self.codes = np.zeros(0, dtype=np.int32)
+            self.sums = np.zeros((0, dim), dtype=np.float32)
+            self.centroids = np.zeros((0, dim), dtype=np.float32)
+            self.classes_ = np.array([], dtype=str)
+
+        index = {str(c): i for i, c in enumerate(self.classes_)}
+        new = [label for label in dict.fromkeys(label for label, _ in entries) if label not in index]
+        if new:
+            index.update((label, len(self.classes_) + i) for i, label in enumerate(new))
+            self.classes_ = np.append(self.classes_, new)
+            self.sums = np.vstack([self.sums, np.zeros((len(new), dim), dtype=np.float32)])
+            self.centroids = np.vstack([self.centroids, np.zeros((len(new), dim), dtype=np.float32)])
+        elif not self.sums.flags.writeable:
+            # Array hasil load() adalah view read-only ke file model
+            self.sums, self.centroids = np.array(self.sums), np.array(self.centroids)
+
+        X = np.concatenate([rows for _, rows in entries])
+        codes = np.concatenate([np.full(len(rows), index[label], dtype=np.int32) for label, rows in entries])
+        self.gallery = np.concatenate([self.gallery, X])
+        self.codes = np.concatenate([self.codes, codes])
+        np.add.at(self.sums, codes, X)
+        touched = np.unique(codes)
+        self.centroids[touched] = normalize_rows(self.sums[touched])
+        return self
+
+    def scores(self, X, block_size=1024):
+        # Return (kode kelas (M,), similarity terbaik kelas tsb (M,))
+        if self.mode == "centroid":
+            S = normalize_rows(X) @ self.centroids.T
+            best = S.argmax(axis=1)
+            return best, S[np.arange(len(S)), best]
+
+        # Galeri sudah ternormalisasi: cukup normalisasi probe
+        idx, sims = topk_similar(normalize_rows(X), self.gallery, self.k, block_size, normalized=True)
+        codes = self.codes[idx]
+        votes = np.zeros((len(codes), len(self.classes_)), dtype=np.float32)
+        np.add.at(votes, (np.arange(len(codes))[:, None], codes), sims)
+        best = votes.argmax(axis=1)
+        return best, np.where(codes == best[:, None], sims, -np.inf).max(axis=1)
+
+    def predict(self, X, threshold=None):
+        # Return (label atau None jika UNKNOWN, similarity) per embedding
+        threshold = self.threshold if threshold is None else threshold
+        best, sims = self.scores(np.atleast_2d(X))
+        labels = [str(self.classes_[c]) if s >= threshold else None for c, s in zip(best, sims)]
+        return labels, sims
+
+    def save(self, path):
+        meta = json.dumps({"k": self.k, "mode": self.mode, "threshold": self.threshold})
+        arrays = {"meta": np.frombuffer(meta.encode("utf-8"), dtype=np.uint8), "gallery": self.gallery,
+                  "codes": self.codes, "sums": self.sums, "centroids": self.centroids,
+                  "classes_": self.classes_}
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            for name in self.FIELDS:
+                np.lib.format.write_array(f, np.ascontiguousarray(arrays[name]), allow_pickle=False)
+                f.write(b"\0" * (-f.tell() % self.ALIGN))  # array berikutnya mulai di batas 64 byte
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, journal=True):
+        # Satu memmap untuk seluruh file, setiap array = view ke bagian datanya
+        buf = np.memmap(path, dtype=np.uint8, mode="r")
+        arrays, offset = {}, 0
+        for name in cls.FIELDS:
+            stream = io.BytesIO(bytes(buf[offset:offset + 4096]))
+            version = np.lib.format.read_magic(stream)
+            read_header = (np.lib.format.read_array_header_1_0 if version == (1, 0)
+                           else np.lib.format.read_array_header_2_0)
+            shape, _, dtype = read_header(stream)
+            offset += stream.tell()
+            size = int(np.prod(shape)) * dtype.itemsize
+            arrays[name] = buf[offset:offset + size].view(dtype).reshape(shape)
+            offset += size + (-(offset + size) % cls.ALIGN)
+
+        meta = json.loads(arrays.pop("meta").tobytes().decode("utf-8"))
+        clf = cls(meta["k"], meta["mode"], meta["threshold"])
+        for name, value in arrays.items():
+            setattr(clf, name, value)
+        if journal:
+            clf.partial_fit_many(cls.read_journal(path)[0])
+        return clf
+
+    # ---------- journal registrasi ----------
+
+    @staticmethod
+    @contextmanager
+    def journal_lock(path):
+        # Kunci eksklusif antar proses: append (enroll.py) vs truncate (train_classifier.py)
+        with open(path + ".journal.lock", "a+b") as f:
+            if os.name == "nt":
+                import msvcrt
+                while True:
+                    try:
+                        f.seek(0)
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        pass  # LK_LOCK menyerah setelah ~10 detik, coba lagi
+                try:
+                    yield
+                finally:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    @classmethod
+    def append_journal(cls, path, label, X):
+        # Biaya sebanding jumlah foto orang baru, bukan jumlah orang di model.
+        # File dibuka setelah kunci didapat, jadi selalu file journal yang aktif
+        with cls.journal_lock(path), open(path + ".journal", "ab") as f:
+            np.lib.format.write_array(f, np.frombuffer(label.encode("utf-8"), dtype=np.uint8))
+            np.lib.format.write_array(f, np.ascontiguousarray(X, dtype=np.float32))
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def read_journal(path):
+        # Return ([(label, embedding)], byte terakhir yang utuh); record terpotong diabaikan
+        entries, end = [], 0
+        if not os.path.exists(path + ".journal"):
+            return entries, end
+        with open(path + ".journal", "rb") as f:
+            while True:
+                try:
+                    label = np.load(f, allow_pickle=False).tobytes().decode("utf-8")
+                    X = np.load(f, allow_pickle=False)
+                except (ValueError, EOFError):
+                    break
+                entries.append((label, X))
+                end = f.tell()
+        return entries, end
+
+    @classmethod
+    def truncate_journal(cls, path, consumed):
+        # Buang `consumed` byte pertama (sudah masuk model hasil retrain);
+        # registrasi yang masuk selama retrain tetap tersimpan. Kunci journal
+        # dipegang dari membaca sisa sampai replace, jadi append tidak hilang
+        journal = path + ".journal"
+        with cls.journal_lock(path):
+            if not os.path.exists(journal):
+                return
+            with open(journal, "rb") as f:
+                f.seek(consumed)
+                rest = f.read()
+            if not rest:
+                os.remove(journal)
+                return
+            with open(journal + ".tmp", "wb") as f:
+                f.write(rest)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(journal + ".tmp", journal)
@@ -0,0 +1,44 @@
+import os, time, argparse
+import numpy as np
+from embedding_store import load_embeddings
+from utils_facenet import find_duplicates
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cari foto duplikat / hampir sama di data training")
+    parser.add_argument("--threshold", type=float, default=0.95, help="Cosine similarity minimal")
+    parser.add_argument("--block-size", type=int, default=1024)
+    parser.add_argument("--drop-list", default=None, help="Tulis path yang sebaiknya dihapus ke file ini")
+    args = parser.parse_args()
+
+    X, y = load_embeddings()
+    paths = None
+    if os.path.exists("X_train.paths.txt"):
+        with open("X_train.paths.txt", encoding="utf-8") as f:
+            paths = f.read().splitlines()
+    name = (lambda i: paths[i]) if paths is not None and len(paths) == len(X) else (lambda i: f"#{i}")
+
+    stats = []
+    t0 = time.perf_counter()
+    pairs, sims = find_duplicates(X, args.threshold, args.block_size, stats)
+    elapsed = time.perf_counter() - t0
+
+    drop = set()
+    for (i, j), sim in zip(pairs, sims):
+        flag = "" if y[i] == y[j] else "  ⚠️ label berbeda"
+        print(f"{sim:.4f}  {name(i)}  <->  {name(j)}{flag}")
+        if i not in drop:
+            drop.add(j)  # simpan foto pertama, buang duplikatnya
+
+    total = sum(b["pairs"] for b in stats)
+    busy = sum(b["seconds"] for b in stats)
+    print(f"\n{len(X)} embedding, {len(pairs)} pasangan >= {args.threshold}, {len(drop)} foto bisa dihapus")
+    print(f"{len(stats)} blok, {total / max(elapsed, 1e-9) / 1e6:.1f} juta pasangan/detik "
+          f"(matmul saja {total / max(busy, 1e-9) / 1e6:.1f} juta/detik), {elapsed:.2f} detik")
+    if stats:
+        rates = [b["pairs_per_sec"] / 1e6 for b in stats]
+        print(f"Per blok: min {min(rates):.1f}, median {np.median(rates):.1f}, maks {max(rates):.1f} juta pasangan/detik")
+
+    if args.drop_list:
+        with open(args.drop_list, "w", encoding="utf-8") as f:
+            f.writelines(name(j) + "\n" for j in sorted(drop))
+        print("Daftar hapus ditulis ke", args.drop_list)
@@ -0,0 +1,161 @@
+import os, json, hashlib, threading
+import numpy as np
+from embedding_store import GrowingArray
+
+class EmbeddingCache:
+    """
+    Cache embedding di disk, key = hash isi file (sha1) + versi model.
+    - Gambar yang tidak berubah tidak di-embed ulang walau dipindah/diganti nama
+    - Index path -> (ukuran, mtime, hash) supaya file yang tidak berubah
+      tidak perlu dibaca & di-hash ulang
+    - Gambar tanpa wajah juga dicatat, jadi tidak dicoba ulang setiap build
+    - Versi model berbeda = cache lama diabaikan
+    Embedding disimpan di matrix .npy (GrowingArray, memmap) dan meta JSON berisi
+    index hash -> baris. save() hanya menambah baris baru ke matrix; matrix baru
+    ditulis ulang (generasi berikutnya) jika lebih dari separuh barisnya sudah di-prune.
+    """
+
+    def __init__(self, path, model_version, dim=512, chunk=4096):
+        self.path = path    # file meta JSON
+        self.model_version = model_version
+        self.dim = dim
+        self.chunk = chunk
+        self.rows = {}      # {hash: baris di matrix}
+        self.failed = set() # hash gambar tanpa wajah
+        self.files = {}     # {path: [size, mtime_ns, hash]}
+        self.used = set()   # hash yang dipakai build ini (sisanya di-prune)
+        self.generation = 0
+        self.stale = []     # file matrix lama, dihapus setelah meta baru tersimpan
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        count = self.load()
+        self.matrix = GrowingArray(self._matrix_path(self.generation), np.float32,
+                                   (dim,), chunk, count)
+
+    def _matrix_path(self, generation):
+        return f"{os.path.splitext(self.path)[0]}.{generation}.npy"
+
+    def load(self):
+        """Baca meta cache; return jumlah baris matrix yang valid (0 = cache kosong)"""
+        if not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except ValueError:
+            print(f"Cache {self.path} tidak bisa dibaca, dibangun ulang")
+            return 0
+        generation = meta.get("generation", 0)
+        if meta.get("model_version") != self.model_version or meta.get("dim") != self.dim:
+            print(f"Cache dibuat dengan model {meta.get('model_version')}, dibangun ulang")
+            self.generation = generation + 1
+            self.stale.append(self._matrix_path(generation))
+            return 0
+        matrix_path = self._matrix_path(generation)
+        count = meta["count"]
+        if not os.path.exists(matrix_path) or \
+                os.path.getsize(matrix_path) < GrowingArray.HEADER + count * self.dim * 4:
+            print(f"Matrix cache {matrix_path} tidak lengkap, dibangun ulang")
+            self.generation = generation + 1
+            self.stale.append(matrix_path)
+            return 0
+        self.generation = generation
+        self.rows = meta["rows"]
+        self.failed = set(meta["failed"])
+        self.files = meta["files"]
+        return count
+
+    def key(self, path):
+        st = os.stat(path)
+        entry = self.files.get(path)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with self.lock:
+            self.files[path] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def lookup(self, key):
+        """Return (ketemu, embedding atau None untuk gambar tanpa wajah)"""
+        with self.lock:
+            self.used.add(key)
+            row = self.rows.get(key)
+            if row is not None:
+                self.hits += 1
+                # Salin: memmap bisa dipetakan ulang saat matrix tumbuh
+                return True, np.array(self.matrix.mm[row])
+            if key in self.failed:
+                self.hits += 1
+                return True, None
+            self.misses += 1
+            return False, None
+
+    def keep(self, path):
+        """Tandai embedding file `path` tetap dipakai tanpa lookup (file yang dilewati build)"""
+        with self.lock:
+            entry = self.files.get(path)
+            if entry:
+                self.used.add(entry[2])
+
+    def put(self, key, emb):
+        with self.lock:
+            if emb is None:
+                self.failed.add(key)
+            elif key not in self.rows:
+                self.rows[key] = self.matrix.rows
+                self.matrix.append(np.asarray(emb, dtype=np.float32))
+
+    def prune(self, paths):
+        """Buang entry file yang sudah dihapus & embedding yang tidak dipakai lagi"""
+        with self.lock:
+            paths = set(paths)
+            self.files = {p: e for p, e in self.files.items() if p in paths}
+            removed = [k for k in self.rows if k not in self.used]
+            for k in removed:
+                del self.rows[k]
+            self.failed &= self.used
+        return len(removed)
+
+    def _compact(self):
+        # Salin baris yang masih dipakai ke matrix generasi baru, urutan baris dipertahankan
+        old = self.matrix
+        self.stale.append(old.path)
+        self.generation += 1
+        self.matrix = GrowingArray(self._matrix_path(self.generation), np.float32,
+                                   (self.dim,), self.chunk)
+        for key in sorted(self.rows, key=self.rows.get):
+            row = self.rows[key]
+            self.rows[key] = self.matrix.rows
+            self.matrix.append(old.mm[row])
+        old.close()
+
+    def save(self):
+        with self.lock:
+            dead = self.matrix.rows - len(self.rows)
+            if dead > len(self.rows) and dead > self.chunk:
+                self._compact()
+            # Baris matrix di-flush dulu, baru meta yang menunjuk ke baris itu diganti
+            self.matrix.write_header()
+            self.matrix.flush()
+            meta = {
+                "model_version": self.model_version,
+                "dim": self.dim,
+                "generation": self.generation,
+                "count": self.matrix.rows,
+                "rows": self.rows,
+                "failed": sorted(self.failed),
+                "files": self.files,
+            }
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp, self.path)
+            for path in self.stale:
+                if os.path.exists(path):
+                    os.remove(path)
+            self.stale = []
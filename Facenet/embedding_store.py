@@ -0,0 +1,180 @@
+import os, io, json
+import numpy as np
+
+class GrowingArray:
+    """
+    File .npy yang diisi baris demi baris lewat memmap dan tumbuh per `chunk` baris.
+    Ruang header .npy dipesan di awal file dan ditulis saat finalize(),
+    jadi hasil akhirnya .npy biasa tanpa perlu menyalin data.
+    """
+    HEADER = 128
+
+    def __init__(self, path, dtype, row_shape=(), chunk=4096, rows=0):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.row_shape = tuple(row_shape)
+        self.chunk = chunk
+        self.rows = rows
+        self.row_bytes = self.dtype.itemsize * int(np.prod(self.row_shape))
+        self.file = open(path, "r+b" if rows > 0 and os.path.exists(path) else "w+b")
+        self.mm = None
+        self.capacity = 0
+        self._grow(max(rows, 1))
+
+    def _grow(self, needed):
+        capacity = -(-needed // self.chunk) * self.chunk
+        if self.mm is not None:
+            self.mm.flush()
+            self.mm = None
+        self.file.truncate(self.HEADER + capacity * self.row_bytes)
+        self.mm = np.memmap(self.file, dtype=self.dtype, mode="r+", offset=self.HEADER,
+                            shape=(capacity,) + self.row_shape)
+        self.capacity = capacity
+
+    def append(self, row):
+        if self.rows >= self.capacity:
+            self._grow(self.rows + 1)
+        self.mm[self.rows] = row
+        self.rows += 1
+
+    def flush(self):
+        self.mm.flush()
+        os.fsync(self.file.fileno())
+
+    def write_header(self):
+        """Tulis header .npy untuk `rows` baris saat ini; sisa kapasitas di belakangnya diabaikan np.load"""
+        header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(header, {
+            "descr": np.lib.format.dtype_to_descr(self.dtype),
+            "fortran_order": False,
+            "shape": (self.rows,) + self.row_shape,
+        })
+        if len(header.getvalue()) != self.HEADER:
+            raise ValueError("Header .npy tidak muat di ruang yang dipesan")
+        self.file.seek(0)
+        self.file.write(header.getvalue())
+        self.file.flush()
+
+    def close(self):
+        self.mm.flush()
+        self.mm = None
+        self.file.close()
+
+    def finalize(self, final_path):
+        self.mm.flush()
+        self.mm = None
+        self.write_header()
+        self.file.truncate(self.HEADER + self.rows * self.row_bytes)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.path, final_path)
+
+class EmbeddingWriter:
+    """
+    Tulis hasil build_embeddings langsung ke disk:
+    - X_train.npy : embedding float32 (N, dim), memmap yang tumbuh per chunk
+    - y_train.npy : kode label int32, indeks ke classes.json
+    - X_train.paths.txt : path gambar tiap baris (urutan sama dengan X)
+    Checkpoint ditulis tiap `checkpoint_every` baris; jika build terputus,
+    run berikutnya melanjutkan dari checkpoint terakhir (resume=True).
+    `on_checkpoint` dipanggil sebelum checkpoint ditulis (mis. EmbeddingCache.save),
+    jadi baris yang tercatat di checkpoint selalu sudah ada di cache.
+    """
+
+    def __init__(self, out_dir=".", dim=512, chunk=4096, checkpoint_every=1024,
+                 model_version=None, resume=True, on_checkpoint=None):
+        self.out_dir = out_dir
+        self.dim = dim
+        self.checkpoint_every = checkpoint_every
+        self.on_checkpoint = on_checkpoint
+        self.model_version = model_version
+        self.x_path = os.path.join(out_dir, "X_train.npy")
+        self.y_path = os.path.join(out_dir, "y_train.npy")
+        self.classes_path = os.path.join(out_dir, "classes.json")
+        self.paths_path = os.path.join(out_dir, "X_train.paths.txt")
+        self.ckpt_path = os.path.join(out_dir, "build_checkpoint.json")
+
+        self.classes = []
+        self.codes = {}
+        self.done = set()
+        rows = self._resume() if resume else 0
+        if rows == 0:
+            self.classes, self.codes, self.done = [], {}, set()
+        self.resumed = rows
+
+        self.X = GrowingArray(self.x_path + ".partial", np.float32, (dim,), chunk, rows)
+        self.y = GrowingArray(self.y_path + ".partial", np.int32, (), chunk, rows)
+        self.paths = open(self.paths_path, "a" if rows else "w", encoding="utf-8")
+
+    @property
+    def rows(self):
+        return self.X.rows
+
+    def _resume(self):
+        if not os.path.exists(self.ckpt_path):
+            return 0
+        with open(self.ckpt_path, encoding="utf-8") as f:
+            ckpt = json.load(f)
+        partials = (self.x_path + ".partial", self.y_path + ".partial", self.paths_path)
+        if ckpt.get("model_version") != self.model_version or ckpt.get("dim") != self.dim \
+                or not all(os.path.exists(p) for p in partials):
+            return 0
+
+        rows = ckpt["rows"]
+        with open(self.paths_path, encoding="utf-8") as f:
+            done = [line.rstrip("\n") for _, line in zip(range(rows), f)]
+        if len(done) < rows:
+            return 0
+        # Baris setelah checkpoint terakhir dibuang, lalu dihitung ulang
+        with open(self.paths_path, "w", encoding="utf-8") as f:
+            f.writelines(p + "\n" for p in done)
+
+        self.classes = ckpt["classes"]
+        self.codes = {c: i for i, c in enumerate(self.classes)}
+        self.done = set(done)
+        return rows
+
+    def append(self, path, cls, emb):
+        code = self.codes.get(cls)
+        if code is None:
+            code = self.codes[cls] = len(self.classes)
+            self.classes.append(cls)
+        self.X.append(emb)
+        self.y.append(code)
+        self.paths.write(path + "\n")
+        if self.rows % self.checkpoint_every == 0:
+            self.checkpoint()
+
+    def checkpoint(self):
+        if self.on_checkpoint is not None:
+            self.on_checkpoint()
+        self.X.flush()
+        self.y.flush()
+        self.paths.flush()
+        os.fsync(self.paths.fileno())
+        ckpt = {"rows": self.rows, "dim": self.dim, "classes": self.classes,
+                "model_version": self.model_version}
+        tmp = self.ckpt_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(ckpt, f)
+        os.replace(tmp, self.ckpt_path)
+
+    def finalize(self):
+        self.checkpoint()
+        self.paths.close()
+        with open(self.classes_path, "w", encoding="utf-8") as f:
+            json.dump(self.classes, f, ensure_ascii=False, indent=2)
+        self.X.finalize(self.x_path)
+        self.y.finalize(self.y_path)
+        os.remove(self.ckpt_path)
+
+def load_embeddings(x_path="X_train.npy", y_path="y_train.npy", classes_path="classes.json", mmap=True):
+    """Return (X, y nama kelas). Mendukung format lama (y berisi string / object array)"""
+    X = np.load(x_path, mmap_mode="r" if mmap else None)
+    y = np.load(y_path, allow_pickle=True)
+    if np.issubdtype(y.dtype, np.integer):
+        with open(classes_path, encoding="utf-8") as f:
+            classes = np.array(json.load(f))
+        y = classes[y]
+    return X, y
@@ -0,0 +1,39 @@
+import os, sys, time, argparse, subprocess
+from cosine_classifier import CosineClassifier
+from predict_one import iter_inputs
+from utils_facenet import embed_images
+
+def start_background_retrain(log_path="retrain.log"):
+    # Jalankan train_classifier.py (retrain penuh + CV paralel) di proses terpisah
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "train_classifier.py")
+    kwargs = {"creationflags": subprocess.DETACHED_PROCESS} if os.name == "nt" else {"start_new_session": True}
+    with open(log_path, "ab") as log:
+        proc = subprocess.Popen([sys.executable, script], stdout=log, stderr=subprocess.STDOUT, **kwargs)
+    return proc.pid
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Daftarkan satu orang baru tanpa melatih ulang model")
+    parser.add_argument("name", help="Nama / label orang")
+    parser.add_argument("images", nargs="+", help="Folder foto atau path gambar")
+    parser.add_argument("--model", default="facenet_cosine.arrays")
+    parser.add_argument("--retrain", action="store_true", help="Mulai retrain penuh di background setelah registrasi")
+    args = parser.parse_args()
+
+    paths = list(iter_inputs(args.images))
+    t0 = time.perf_counter()
+    index, embs = embed_images(paths)
+    t_embed = time.perf_counter() - t0
+    if not len(embs):
+        raise SystemExit("❌ Tidak ada wajah yang terdeteksi, registrasi dibatalkan")
+
+    t0 = time.perf_counter()
+    CosineClassifier.append_journal(args.model, args.name, embs)
+    t_enroll = time.perf_counter() - t0
+
+    print(f"✓ {args.name} terdaftar dengan {len(embs)} dari {len(paths)} foto "
+          f"(embedding {t_embed:.2f} detik, simpan {t_enroll * 1000:.2f} ms)")
+    entries, _ = CosineClassifier.read_journal(args.model)
+    print(f"Journal {args.model}.journal: {len(entries)} registrasi menunggu retrain penuh")
+
+    if args.retrain:
+        print("Retrain penuh berjalan di background, PID", start_background_retrain())
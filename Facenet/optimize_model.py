@@ -0,0 +1,64 @@
+import os, glob, time, copy, argparse
+import numpy as np
+import torch
+from facenet_pytorch import InceptionResnetV1
+from utils_facenet import read_img_bgr, face_align, cosine_similarity, optimize_embedder
+
+def load_val_faces(root):
+    faces, paths = [], []
+    for path in sorted(glob.glob(os.path.join(root, "*", "*"))):
+        face = face_align(read_img_bgr(path))
+        if face is None:
+            print("⚠️ Wajah tidak terdeteksi:", path)
+            continue
+        faces.append(face)
+        paths.append(path)
+    return faces, paths
+
+@torch.no_grad()
+def embed_all(model, faces):
+    return model(torch.stack(faces)).numpy()
+
+@torch.no_grad()
+def latency_ms(model, batch_size, repeat=10):
+    x = torch.randn(batch_size, 3, 160, 160)
+    model(x)  # warmup (traced model dioptimasi saat panggilan pertama)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        model(x)
+    return (time.perf_counter() - t0) / repeat * 1000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cek akurasi & kecepatan mode inferensi FaceNet")
+    parser.add_argument("--val", default="data/val")
+    parser.add_argument("--modes", nargs="+", default=["traced", "int8"])
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    args = parser.parse_args()
+
+    if args.threads > 0:
+        torch.set_num_threads(args.threads)
+    print("Intra-op threads:", torch.get_num_threads())
+
+    base = InceptionResnetV1(pretrained='vggface2').eval()
+    faces, paths = load_val_faces(args.val)
+    print(f"{len(faces)} wajah validasi dari {args.val}")
+    ref = embed_all(base, faces) if faces else None
+
+    print(f"{'mode':<8}{'batch1 ms':>11}{'batch16 ms':>12}{'cos min':>10}{'cos mean':>10}")
+    print(f"{'eager':<8}{latency_ms(base, 1):>11.1f}{latency_ms(base, 16):>12.1f}{1.0:>10.4f}{1.0:>10.4f}")
+
+    ok = True
+    for mode in args.modes:
+        model = optimize_embedder(copy.deepcopy(base), mode)
+        cos = [1.0]
+        if faces:
+            emb = embed_all(model, faces)
+            cos = [cosine_similarity(a, b) for a, b in zip(ref, emb)]
+        passed = min(cos) >= args.min_cosine
+        ok = ok and passed
+        print(f"{mode:<8}{latency_ms(model, 1):>11.1f}{latency_ms(model, 16):>12.1f}"
+              f"{min(cos):>10.4f}{np.mean(cos):>10.4f}  {'OK' if passed else 'TIDAK LOLOS'}")
+
+    print("\n✓ Semua mode lolos cek akurasi" if ok else "\n❌ Ada mode di bawah batas cosine")
+    raise SystemExit(0 if ok else 1)
@@ -1,27 +1,175 @@
+import os, json, time, argparse
+from concurrent.futures import ThreadPoolExecutor
 import joblib
-from utils_facenet import embed_from_path
+from utils_facenet import read_img_bgr, bgr_to_pil, face_align, get_mtcnn, embed_face_tensors
+from cosine_classifier import CosineClassifier
+from batcher import get_batcher
 import numpy as np
 
-clf = joblib.load("facenet_knn.joblib")
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
 
-def predict_image(path, unknown_threshold=0.70):
+_models = {}
+
+# Model lama (StandardScaler+KNN) yang ikut di repo, dipakai jika .arrays belum dibuat
+FALLBACK_MODEL = "facenet_knn.joblib"
+
+def get_classifier(path="facenet_cosine.arrays"):
+    # Dimuat sekali saat pertama dipakai, bukan saat import.
+    # .joblib = pipeline sklearn (train_classifier.py), selain itu CosineClassifier (train_knn.py)
+    if path not in _models:
+        if not os.path.exists(path):
+            if path.endswith(".joblib") or not os.path.exists(FALLBACK_MODEL):
+                script = "train_classifier.py" if path.endswith(".joblib") else "train_knn.py"
+                raise FileNotFoundError(f"Model {path} tidak ditemukan. Jalankan {script} terlebih dahulu")
+            print(f"⚠️ {path} belum ada (jalankan train_knn.py terlebih dahulu), sementara memakai {FALLBACK_MODEL}")
+            _models[path] = get_classifier(FALLBACK_MODEL)
+        else:
+            _models[path] = joblib.load(path) if path.endswith(".joblib") else CosineClassifier.load(path)
+    return _models[path]
+
+def decide(clf, proba, unknown_threshold):
+    idx = int(np.argmax(proba))
+    confidence = float(proba[idx])
+    label = None if confidence < unknown_threshold else str(clf.classes_[idx])
+    return label, confidence
+
+def classify(clf, embs, unknown_threshold=None):
+    # Return [(label atau None jika UNKNOWN, confidence)] untuk matriks embedding.
+    # CosineClassifier: confidence = cosine similarity, default threshold model itu sendiri.
+    # Pipeline sklearn: confidence = predict_proba, default threshold 0.70
+    if isinstance(clf, CosineClassifier):
+        labels, sims = clf.predict(embs, unknown_threshold)
+        return [(label, float(sim)) for label, sim in zip(labels, sims)]
+    threshold = 0.70 if unknown_threshold is None else unknown_threshold
+    return [decide(clf, proba, threshold) for proba in clf.predict_proba(embs)]
+
+def predict_image(path, unknown_threshold=None, clf=None):
     print(f"\nMemprediksi gambar: {path}")
 
-    emb = embed_from_path(path)
+    # Lewat batcher bersama: pemanggilan dari banyak thread digabung jadi satu forward pass
+    face = face_align(read_img_bgr(path))
+    emb = get_batcher().embed(face)
     if emb is None:
         print("❌ Wajah tidak terdeteksi!")
         return
 
-    proba = clf.predict_proba([emb])[0]
-    idx = np.argmax(proba)
-
-    label = clf.classes_[idx]
-    confidence = float(proba[idx])
+    clf = clf or get_classifier()
+    label, confidence = classify(clf, [emb], unknown_threshold)[0]
 
-    if confidence < unknown_threshold:
+    if label is None:
         print(f"Prediksi: UNKNOWN (conf={confidence:.3f})")
     else:
         print(f"Prediksi: {label} (conf={confidence:.3f})")
 
+def iter_inputs(sources):
+    # Folder (rekursif), file .txt berisi satu path per baris, atau path gambar langsung
+    for src in sources:
+        if os.path.isdir(src):
+            for dirpath, _, files in os.walk(src):
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() in IMAGE_EXTS:
+                        yield os.path.join(dirpath, name)
+        elif src.endswith(".txt"):
+            with open(src, encoding="utf-8") as f:
+                yield from (line.strip() for line in f if line.strip())
+        else:
+            yield src
+
+def _decode(path):
+    t0 = time.perf_counter()
+    try:
+        img = bgr_to_pil(read_img_bgr(path))
+    except Exception:
+        img = None
+    return img, time.perf_counter() - t0
+
+def predict_batch(paths, unknown_threshold=None, clf=None, pool=None):
+    """
+    Prediksi sekumpulan gambar: decode paralel, MTCNN per kelompok ukuran gambar,
+    embedding satu forward pass, dan klasifikasi sekali untuk seluruh batch.
+    latency_ms per gambar = waktu decode-nya sendiri + bagian rata dari waktu batch.
+    """
+    clf = clf or get_classifier()
+    decoded = list(pool.map(_decode, paths)) if pool else [_decode(p) for p in paths]
+    latency = [t for _, t in decoded]
+    results = [{"path": p, "label": None, "confidence": None, "unknown": None, "error": None}
+               for p in paths]
+
+    # MTCNN batch hanya untuk gambar berukuran sama
+    groups = {}
+    for i, (img, _) in enumerate(decoded):
+        if img is None:
+            results[i]["error"] = "gagal dibaca"
+        else:
+            groups.setdefault(img.size, []).append(i)
+    faces, face_rows = [], []
+    for rows in groups.values():
+        t0 = time.perf_counter()
+        aligned = get_mtcnn()([decoded[i][0] for i in rows])
+        share = (time.perf_counter() - t0) / len(rows)
+        for i, face in zip(rows, aligned):
+            latency[i] += share
+            if face is None:
+                results[i]["error"] = "wajah tidak terdeteksi"
+            else:
+                faces.append(face)
+                face_rows.append(i)
+
+    if faces:
+        t0 = time.perf_counter()
+        predictions = classify(clf, embed_face_tensors(faces), unknown_threshold)
+        share = (time.perf_counter() - t0) / len(faces)
+        for i, (label, confidence) in zip(face_rows, predictions):
+            results[i].update(label=label, confidence=round(confidence, 4), unknown=label is None)
+            latency[i] += share
+
+    for result, seconds in zip(results, latency):
+        result["latency_ms"] = round(seconds * 1000, 2)
+    return results
+
+def run_batch(sources, out, batch_size=32, unknown_threshold=None, workers=4, model="facenet_cosine.arrays"):
+    # Tulis satu baris JSON per gambar ke `out`, return ringkasan
+    clf = get_classifier(model)
+    summary = {"images": 0, "known": 0, "unknown": 0, "errors": 0}
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool, open(out, "w", encoding="utf-8") as f:
+        batch = []
+        for path in iter_inputs(sources):
+            batch.append(path)
+            if len(batch) < batch_size:
+                continue
+            _write(f, predict_batch(batch, unknown_threshold, clf, pool), summary)
+            batch = []
+        if batch:
+            _write(f, predict_batch(batch, unknown_threshold, clf, pool), summary)
+    summary["seconds"] = time.perf_counter() - t0
+    return summary
+
+def _write(f, results, summary):
+    for r in results:
+        f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        summary["images"] += 1
+        summary["errors" if r["error"] else "unknown" if r["unknown"] else "known"] += 1
+    f.flush()
+
 if __name__ == "__main__":
-    predict_image("data/val/Zalda/z1.jpg")
+    parser = argparse.ArgumentParser(description="Prediksi identitas wajah dari embedding FaceNet")
+    parser.add_argument("images", nargs="*", help="Gambar untuk diprediksi satu per satu")
+    parser.add_argument("--batch", nargs="+", metavar="SRC", help="Folder / daftar .txt / gambar untuk mode batch")
+    parser.add_argument("--out", default="predictions.jsonl", help="Hasil mode batch (JSONL)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4, help="Thread decode gambar")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="unknown_threshold (default: threshold model cosine, 0.70 untuk predict_proba)")
+    parser.add_argument("--model", default="facenet_cosine.arrays",
+                        help="facenet_cosine.arrays atau model .joblib (mis. facenet_svm.joblib)")
+    args = parser.parse_args()
+
+    if args.batch:
+        s = run_batch(args.batch, args.out, args.batch_size, args.threshold, args.workers, args.model)
+        print(f"{s['images']} gambar: {s['known']} dikenali, {s['unknown']} UNKNOWN, {s['errors']} gagal")
+        print(f"{s['images'] / max(s['seconds'], 1e-9):.1f} img/detik ({s['seconds']:.1f} detik), hasil di {args.out}")
+    else:
+        clf = get_classifier(args.model)
+        for path in args.images or ["data/val/Zalda/z1.jpg"]:
+            predict_image(path, args.threshold, clf)
@@ -0,0 +1,176 @@
+import time, random, itertools, argparse, csv
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.svm import SVC
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import StandardScaler
+from sklearn.model_selection import StratifiedKFold
+from embedding_store import load_embeddings
+from cosine_classifier import CosineClassifier
+
+# (family, apakah pakai StandardScaler, grid parameter)
+GRID = [
+    ("svm", True, {"kernel": ["rbf", "linear"], "C": [1, 10, 100]}),
+    ("knn", True, {"n_neighbors": [1, 3, 5], "metric": ["euclidean"]}),
+    ("knn", False, {"n_neighbors": [1, 3, 5], "metric": ["cosine"]}),
+    ("cosine", False, {"mode": ["exemplar"], "k": [1, 3, 5]}),
+    ("cosine", False, {"mode": ["centroid"]}),
+]
+
+def expand(grid):
+    for family, scaled, params in grid:
+        keys = sorted(params)
+        for values in itertools.product(*(params[k] for k in keys)):
+            yield family, scaled, dict(zip(keys, values))
+
+def make_model(family, params):
+    if family == "svm":
+        # Sama seperti train_classifier.py (probability=True dipakai predict_one)
+        return SVC(gamma="scale", probability=True, class_weight="balanced", **params)
+    if family == "knn":
+        return KNeighborsClassifier(**params)
+    return CosineClassifier(threshold=-1.0, **params)  # akurasi closed-set, tanpa UNKNOWN
+
+def make_folds(X, y, n_splits, seed=0):
+    # Split & scaler setiap fold dihitung sekali, dipakai ulang semua kandidat
+    folds = []
+    for train, test in StratifiedKFold(n_splits, shuffle=True, random_state=seed).split(X, y):
+        Xtr, Xte = np.asarray(X[train], dtype=np.float32), np.asarray(X[test], dtype=np.float32)
+        scaler = StandardScaler().fit(Xtr)
+        folds.append({"Xtr": Xtr, "Xte": Xte, "ytr": y[train], "yte": y[test], "scaler": scaler,
+                      "Xtr_s": scaler.transform(Xtr).astype(np.float32),
+                      "Xte_s": scaler.transform(Xte).astype(np.float32)})
+    return folds
+
+def drop_small_classes(X, y, min_samples=2):
+    # StratifiedKFold butuh >= 2 sampel per kelas
+    classes, counts = np.unique(y, return_counts=True)
+    small = classes[counts < min_samples]
+    if len(small) == 0:
+        return X, y
+    print(f"⚠️ {len(small)} kelas dengan < {min_samples} sampel dilewati: {', '.join(small[:10])}"
+          + (" ..." if len(small) > 10 else ""))
+    keep = np.flatnonzero(~np.isin(y, small))
+    return X[keep], y[keep]
+
+def evaluate(family, scaled, params, fold, latency_repeat=20):
+    try:
+        return measure(family, scaled, params, fold, latency_repeat)
+    except Exception as e:
+        # Mis. n_neighbors > sampel fold: dicatat sebagai baris gagal, grid tetap jalan
+        return {"error": f"{type(e).__name__}: {e}"}
+
+def measure(family, scaled, params, fold, latency_repeat):
+    Xtr, Xte = (fold["Xtr_s"], fold["Xte_s"]) if scaled else (fold["Xtr"], fold["Xte"])
+    model = make_model(family, params)
+
+    t0 = time.perf_counter()
+    model.fit(Xtr, fold["ytr"])
+    fit_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    pred = model.predict(Xte)
+    batch_s = time.perf_counter() - t0
+    if family == "cosine":
+        pred = pred[0]
+    acc = float(np.mean(np.asarray(pred, dtype=str) == fold["yte"]))
+
+    result = {"acc": acc, "fit_s": fit_s, "batch_us": batch_s / len(Xte) * 1e6}
+    if latency_repeat > 0:
+        # Latency satu wajah seperti di predict_one: (scaler) + predict_proba / predict
+        infer = model.predict_proba if hasattr(model, "predict_proba") else model.predict
+        raw = fold["Xte"][:1]
+        times = []
+        for _ in range(latency_repeat):
+            t0 = time.perf_counter()
+            infer(fold["scaler"].transform(raw) if scaled else raw)
+            times.append(time.perf_counter() - t0)
+        result["single_ms"] = float(np.median(times)) * 1000
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cari model & hyperparameter terbaik (akurasi + latency)")
+    parser.add_argument("--cv", type=int, default=5, help="Jumlah fold (dibatasi sampel kelas terkecil)")
+    parser.add_argument("--jobs", type=int, default=-1, help="Proses paralel")
+    parser.add_argument("--random", type=int, default=0, help="Random search N kandidat (0 = seluruh grid)")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Batas latency prediksi satu wajah")
+    parser.add_argument("--out", default="leaderboard.csv")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    X, y = load_embeddings()  # memmap, dibaca sekali
+    y = np.asarray(y, dtype=str)
+    X, y = drop_small_classes(X, y)
+    if len(np.unique(y)) < 2:
+        raise SystemExit("❌ Butuh minimal 2 kelas dengan >= 2 embedding. Tambah foto lalu jalankan build_embeddings.py")
+    n_splits = max(2, min(args.cv, np.unique(y, return_counts=True)[1].min()))
+    folds = make_folds(X, y, n_splits, args.seed)
+
+    candidates = list(expand(GRID))
+    if args.random and args.random < len(candidates):
+        candidates = random.Random(args.seed).sample(candidates, args.random)
+    print(f"{len(X)} embedding, {len(np.unique(y))} kelas, {len(candidates)} kandidat x {n_splits} fold")
+
+    t0 = time.perf_counter()
+    # Tahap 1, paralel: akurasi saja. Waktu di worker paralel ikut terpengaruh
+    # rebutan CPU, jadi tidak dipakai untuk leaderboard.
+    # joblib (loky) mengirim array fold ke worker sebagai memmap, bukan salinan per tugas
+    results = Parallel(n_jobs=args.jobs)(
+        delayed(evaluate)(family, scaled, params, fold, latency_repeat=0)
+        for family, scaled, params in candidates for fold in folds
+    )
+    # Tahap 2, serial di proses ini: fit, batch & latency satu wajah pada fold pertama
+    # untuk setiap kandidat yang berhasil, tanpa proses lain yang berjalan bersamaan
+    timings = {}
+    for c, (family, scaled, params) in enumerate(candidates):
+        if not any("error" in r for r in results[c * n_splits:(c + 1) * n_splits]):
+            timings[c] = evaluate(family, scaled, params, folds[0])
+    elapsed = time.perf_counter() - t0
+
+    rows = []
+    for c, (family, scaled, params) in enumerate(candidates):
+        per_fold = results[c * n_splits:(c + 1) * n_splits]
+        row = {
+            "model": family + ("+scaler" if scaled else ""),
+            "params": " ".join(f"{k}={v}" for k, v in params.items()),
+        }
+        errors = [r["error"] for r in per_fold + [timings.get(c, {})] if "error" in r]
+        if errors:
+            row.update(acc=np.nan, acc_std=np.nan, fit_s=np.nan, single_ms=np.nan, batch_us=np.nan,
+                       error=errors[0])
+        else:
+            row.update(
+                acc=np.mean([r["acc"] for r in per_fold]),
+                acc_std=np.std([r["acc"] for r in per_fold]),
+                fit_s=timings[c]["fit_s"],
+                single_ms=timings[c]["single_ms"],
+                batch_us=timings[c]["batch_us"],
+                error="",
+            )
+        rows.append(row)
+    # Kandidat gagal di urutan terakhir
+    rows.sort(key=lambda r: (bool(r["error"]), -np.nan_to_num(r["acc"]), np.nan_to_num(r["single_ms"])))
+    for r in rows:
+        r["within_budget"] = not r["error"] and (args.budget_ms is None or r["single_ms"] <= args.budget_ms)
+
+    print(f"\n{'model':<15}{'params':<32}{'acc':>7}{'±':>7}{'fit s':>8}{'1 wajah ms':>12}{'batch µs':>10}")
+    for r in rows:
+        if r["error"]:
+            print(f"{r['model']:<15}{r['params']:<32}  gagal: {r['error']}")
+            continue
+        mark = "" if r["within_budget"] else "  (lewat budget)"
+        print(f"{r['model']:<15}{r['params']:<32}{r['acc']:>7.3f}{r['acc_std']:>7.3f}{r['fit_s']:>8.3f}"
+              f"{r['single_ms']:>12.3f}{r['batch_us']:>10.1f}{mark}")
+
+    with open(args.out, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    best = next((r for r in rows if r["within_budget"]), None)
+    print(f"\nSelesai dalam {elapsed:.1f} detik, leaderboard di {args.out}")
+    if best is None:
+        print(f"❌ Tidak ada model dengan latency <= {args.budget_ms} ms")
+    else:
+        print(f"✓ Terbaik{' dalam budget' if args.budget_ms else ''}: {best['model']} {best['params']} "
+              f"(acc {best['acc']:.3f}, {best['single_ms']:.3f} ms/wajah)")
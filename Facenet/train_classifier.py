@@ -1,12 +1,28 @@
+import os, argparse
 import numpy as np
 from sklearn.svm import SVC
 from sklearn.model_selection import cross_val_score
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
 import joblib
+from embedding_store import load_embeddings
+from cosine_classifier import CosineClassifier
 
-X = np.load("X_train.npy")
-y = np.load("y_train.npy", allow_pickle=True)
+# Retrain penuh: X_train + semua registrasi di journal (enroll.py).
+# Bisa dijalankan berkala / di background (enroll.py --retrain)
+parser = argparse.ArgumentParser(description="Retrain penuh SVM + model cosine")
+parser.add_argument("--cv", type=int, default=2)
+parser.add_argument("--jobs", type=int, default=-1, help="Proses paralel untuk cross-validation")
+parser.add_argument("--out", default="facenet_svm.joblib")
+parser.add_argument("--cosine-model", default="facenet_cosine.arrays")
+args = parser.parse_args()
+
+X, y = load_embeddings()
+entries, consumed = CosineClassifier.read_journal(args.cosine_model)
+if entries:
+    X = np.concatenate([X] + [embs for _, embs in entries])
+    y = np.concatenate([y.astype(str)] + [np.full(len(embs), label) for label, embs in entries])
+    print(f"{len(entries)} registrasi dari journal ikut dilatih")
 
 clf = Pipeline([
     ("scaler", StandardScaler()),
@@ -14,11 +30,22 @@ clf = Pipeline([
                 probability=True, class_weight="balanced"))
 ])
 
-# Karena data < 5 → gunakan cv=2 saja
-scores = cross_val_score(clf, X, y, cv=2, scoring="accuracy")
+# Karena data < 5 → gunakan cv=2 saja (fold tidak boleh melebihi sampel kelas terkecil)
+cv = max(2, min(args.cv, np.unique(y, return_counts=True)[1].min()))
+scores = cross_val_score(clf, X, y, cv=cv, scoring="accuracy", n_jobs=args.jobs)
 print("CV acc mean:", scores.mean(), "±", scores.std())
 
 clf.fit(X, y)
-joblib.dump(clf, "facenet_svm.joblib")
+joblib.dump(clf, args.out + ".tmp")
+os.replace(args.out + ".tmp", args.out)
+print(f"\n✓ Model disimpan sebagai {args.out}")
 
-print("\n✓ Model disimpan sebagai facenet_svm.joblib")
+# Model cosine ditulis ulang dari semua data, lalu journal yang sudah masuk dibuang
+if os.path.exists(args.cosine_model):
+    old = CosineClassifier.load(args.cosine_model, journal=False)
+    cosine = CosineClassifier(old.k, old.mode, old.threshold)
+else:
+    cosine = CosineClassifier()
+cosine.fit(X, y).save(args.cosine_model)
+CosineClassifier.truncate_journal(args.cosine_model, consumed)
+print(f"✓ Model cosine diperbarui: {args.cosine_model} ({len(cosine.classes_)} kelas)")
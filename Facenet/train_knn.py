@@ -1,19 +1,35 @@
-import numpy as np, joblib
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.preprocessing import StandardScaler
-from sklearn.pipeline import Pipeline
+import argparse
+import numpy as np
+from embedding_store import load_embeddings
+from cosine_classifier import CosineClassifier
+from utils_facenet import topk_similar
+
+parser = argparse.ArgumentParser(description="Latih klasifier nearest-neighbour cosine dari X_train.npy")
+parser.add_argument("--k", type=int, default=1, help="Jumlah tetangga (mode exemplar)")
+parser.add_argument("--mode", choices=["exemplar", "centroid"], default="exemplar")
+parser.add_argument("--threshold", type=float, default=0.7, help="Cosine minimal, di bawahnya UNKNOWN")
+parser.add_argument("--out", default="facenet_cosine.arrays")
+parser.add_argument("--self-check", type=int, default=1000,
+                    help="Leave-one-out pada N embedding acak (0 = lewati)")
+args = parser.parse_args()
 
 # Load embedding
-X = np.load("X_train.npy")
-y = np.load("y_train.npy", allow_pickle=True)
+X, y = load_embeddings()
 
-# KNN lebih bagus untuk dataset kecil
-clf = Pipeline([
-    ("scaler", StandardScaler()),
-    ("knn", KNeighborsClassifier(n_neighbors=1, metric="euclidean"))
-])
+# Tetangga terdekat di ruang cosine: cocok untuk dataset kecil, tanpa StandardScaler
+clf = CosineClassifier(k=args.k, mode=args.mode, threshold=args.threshold).fit(X, y)
+clf.save(args.out)
 
-clf.fit(X, y)
-joblib.dump(clf, "facenet_knn.joblib")
+# Leave-one-out pada sampel: tetangga terdekat selain dirinya sendiri.
+# Sampel menjaga biaya O(sampel x N), bukan O(N^2) seluruh galeri
+n = len(clf.gallery)
+if args.self_check > 0 and n > 1:
+    probes = np.random.default_rng(0).choice(n, size=min(args.self_check, n), replace=False)
+    idx, sims = topk_similar(clf.gallery[probes], clf.gallery, k=2, normalized=True)
+    other = np.argmax(idx != probes[:, None], axis=1)  # kolom pertama yang bukan dirinya
+    rows = np.arange(len(probes))
+    acc = np.mean(clf.codes[idx[rows, other]] == clf.codes[probes])
+    print(f"Leave-one-out top-1 ({len(probes)} sampel): {acc:.3f}, "
+          f"similarity tetangga median {np.median(sims[rows, other]):.3f}")
 
-print("Model KNN tersimpan sebagai facenet_knn.joblib")
+print(f"Model cosine ({args.mode}, {len(clf.gallery)} embedding, {len(clf.classes_)} kelas) tersimpan sebagai {args.out}")
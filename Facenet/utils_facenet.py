@@ -1,11 +1,77 @@
-import torch, numpy as np, cv2 
+import os, time, threading, numpy as np, cv2 
 from PIL import Image 
-from facenet_pytorch import MTCNN, InceptionResnetV1 
  
-device = 'cuda' if torch.cuda.is_available() else 'cpu'
+# torch & facenet_pytorch baru di-import saat model pertama kali dipakai (lazy),
+# jadi script yang hanya butuh fungsi ringan tidak membayar inisialisasi model.
+# mtcnn / embedder / device tetap bisa diakses sebagai atribut modul (lihat __getattr__)
  
-mtcnn = MTCNN(image_size=160, margin=20, post_process=True, device=device)
-embedder = InceptionResnetV1(pretrained='vggface2').eval().to(device)
+# Mode inferensi CPU: eager (fp32 biasa) / traced (TorchScript + freeze) / int8 (Linear int8 + traced)
+INFER_MODE = os.getenv("FACENET_MODE", "eager")
+NUM_THREADS = int(os.getenv("FACENET_THREADS", "0"))  # 0 = default torch (semua core)
+ 
+# Ganti jika bobot / preprocessing / mode berubah (membatalkan cache embedding lama)
+MODEL_VERSION = f"inception_resnet_v1-vggface2-mtcnn160m20-{INFER_MODE}"
+ 
+_models = {}
+_lock = threading.Lock()
+ 
+def get_device(): 
+    if "device" not in _models: 
+        import torch
+        if NUM_THREADS > 0: 
+            torch.set_num_threads(NUM_THREADS)
+        _models["device"] = 'cuda' if torch.cuda.is_available() else 'cpu'
+    return _models["device"]
+ 
+def optimize_embedder(model, mode="eager"): 
+    import torch
+    model = model.eval()
+    if mode == "eager" or get_device() != 'cpu': 
+        return model
+    if mode == "int8": 
+        # Dynamic quantization hanya untuk layer Linear (bobot int8, aktivasi tetap float)
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif mode != "traced": 
+        raise ValueError(f"FACENET_MODE tidak dikenal: {mode}")
+    example = torch.zeros(1, 3, 160, 160)
+    with torch.no_grad(): 
+        traced = torch.jit.trace(model, example)
+        return torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+ 
+def get_mtcnn(): 
+    # Singleton, dibuat sekali walau dipanggil dari banyak thread
+    if "mtcnn" not in _models: 
+        with _lock: 
+            if "mtcnn" not in _models: 
+                from facenet_pytorch import MTCNN
+                _models["mtcnn"] = MTCNN(image_size=160, margin=20, post_process=True, device=get_device())
+    return _models["mtcnn"]
+ 
+def get_embedder(): 
+    if "embedder" not in _models: 
+        with _lock: 
+            if "embedder" not in _models: 
+                from facenet_pytorch import InceptionResnetV1
+                model = InceptionResnetV1(pretrained='vggface2').to(get_device())
+                _models["embedder"] = optimize_embedder(model, INFER_MODE)
+    return _models["embedder"]
+ 
+def __getattr__(name): 
+    if name == "mtcnn": 
+        return get_mtcnn()
+    if name == "embedder": 
+        return get_embedder()
+    if name == "device": 
+        return get_device()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+ 
+def warmup(batch_size=1): 
+    # Jalankan batch dummy supaya request pertama tidak membayar alokasi memori,
+    # optimasi TorchScript, dll. Panggil sekali saat server start.
+    import torch
+    with torch.no_grad(): 
+        get_embedder()(torch.zeros(batch_size, 3, 160, 160, device=get_device()))
+    get_mtcnn()(Image.new("RGB", (160, 160)))
  
 def read_img_bgr(path): 
     img = cv2.imread(path)
@@ -16,21 +82,31 @@ def read_img_bgr(path):
 def bgr_to_pil(img_bgr): 
     return Image.fromarray(cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)) 
  
-@torch.no_grad() 
 def face_align(img_bgr): 
+    import torch
     pil = bgr_to_pil(img_bgr) 
-    aligned = mtcnn(pil)
+    with torch.no_grad(): 
+        aligned = get_mtcnn()(pil)
     return aligned 
  
-@torch.no_grad() 
 def embed_face_tensor(face_tensor): 
+    import torch
     if face_tensor is None: 
         return None 
-    face_tensor = face_tensor.unsqueeze(0).to(device)
-    emb = embedder(face_tensor)
+    face_tensor = face_tensor.unsqueeze(0).to(get_device())
+    with torch.no_grad(): 
+        emb = get_embedder()(face_tensor)
     return emb.squeeze(0).cpu().numpy()
+
+def embed_face_tensors(face_tensors): 
+    # Banyak wajah (3x160x160) dalam satu forward pass -> array (N, 512)
+    import torch
+    if len(face_tensors) == 0: 
+        return np.zeros((0, 512), dtype=np.float32)
+    batch = torch.stack(list(face_tensors)).to(get_device())
+    with torch.no_grad(): 
+        return get_embedder()(batch).cpu().numpy()
  
-@torch.no_grad() 
 def embed_from_path(path): 
     img = read_img_bgr(path)
     face = face_align(img)
@@ -38,7 +114,107 @@ def embed_from_path(path):
         return None
     return embed_face_tensor(face)
  
+def embed_images(paths, batch_size=32):
+    # Align + embedding per batch -> ({path: index baris}, matriks (N, 512)); gambar tanpa wajah dilewati
+    index, faces = {}, []
+    for path in paths:
+        try:
+            face = face_align(read_img_bgr(path))
+        except ValueError:
+            face = None
+        if face is None:
+            print("⚠️ Wajah tidak terdeteksi:", path)
+            continue
+        index[path] = len(faces)
+        faces.append(face)
+    embs = [embed_face_tensors(faces[i:i + batch_size]) for i in range(0, len(faces), batch_size)]
+    return index, np.concatenate(embs) if embs else np.zeros((0, 512), dtype=np.float32)
+ 
 def cosine_similarity(a, b, eps=1e-8): 
     a = a / (np.linalg.norm(a) + eps)
     b = b / (np.linalg.norm(b) + eps)
     return float(np.dot(a, b))
+ 
+def normalize_rows(X, eps=1e-8): 
+    # Matriks embedding (N, D) -> float32 dengan panjang tiap baris 1
+    X = np.asarray(X, dtype=np.float32)
+    return X / (np.linalg.norm(X, axis=1, keepdims=True) + eps)
+ 
+def similarity_blocks(probes, gallery=None, block_size=1024, stats=None, triangle=False, normalized=False): 
+    # Yield (i0, j0, S): cosine similarity probes[i0:i0+b] x gallery[j0:j0+b] per blok,
+    # jadi memori per langkah hanya block_size^2 float32 walau N puluhan ribu.
+    # gallery=None -> all-vs-all; triangle=True hanya blok j0 >= i0 (pasangan simetris).
+    # stats (list) diisi waktu & throughput (pasangan/detik) setiap blok.
+    P = probes if normalized else normalize_rows(probes)
+    G = P if gallery is None else (gallery if normalized else normalize_rows(gallery))
+    for i0 in range(0, len(P), block_size): 
+        pb = P[i0:i0 + block_size]
+        for j0 in range(i0 if triangle else 0, len(G), block_size): 
+            t0 = time.perf_counter()
+            S = pb @ G[j0:j0 + block_size].T
+            seconds = time.perf_counter() - t0
+            if stats is not None: 
+                stats.append({"block": (i0, j0), "pairs": S.size, "seconds": seconds,
+                              "pairs_per_sec": S.size / seconds if seconds > 0 else float("inf")})
+            yield i0, j0, S
+ 
+def topk_similar(probes, gallery=None, k=5, block_size=1024, stats=None, normalized=False): 
+    # Pencarian 1:N: untuk setiap probe, k gallery paling mirip -> (index (N, k), similarity (N, k)),
+    # urut dari yang paling mirip. gallery=None -> cari di antara probes sendiri (tanpa diri sendiri).
+    # normalized=True: probes & gallery sudah dinormalisasi (tidak disalin ulang).
+    self_search = gallery is None
+    n_gallery = len(probes) if self_search else len(gallery)
+    k = max(0, min(k, n_gallery - self_search))
+    best_s = np.full((len(probes), k), -np.inf, dtype=np.float32)
+    best_i = np.full((len(probes), k), -1, dtype=np.int64)
+    if k == 0: 
+        return best_i, best_s
+ 
+    for i0, j0, S in similarity_blocks(probes, gallery, block_size, stats, normalized=normalized): 
+        if self_search and i0 == j0: 
+            np.fill_diagonal(S, -np.inf)  # blok diagonal: probe = gallery
+        rows = np.arange(i0, i0 + len(S))
+        cols = np.arange(j0, j0 + S.shape[1])
+        cand_s = np.concatenate([best_s[rows], S], axis=1)
+        cand_i = np.concatenate([best_i[rows], np.broadcast_to(cols, S.shape)], axis=1)
+        top = np.argpartition(-cand_s, k - 1, axis=1)[:, :k]
+        best_s[rows] = np.take_along_axis(cand_s, top, axis=1)
+        best_i[rows] = np.take_along_axis(cand_i, top, axis=1)
+ 
+    order = np.argsort(-best_s, axis=1)
+    return np.take_along_axis(best_i, order, axis=1), np.take_along_axis(best_s, order, axis=1)
+ 
+def find_duplicates(X, threshold=0.95, block_size=1024, stats=None): 
+    # Semua pasangan (i, j), i < j, dengan similarity >= threshold -> (pairs (M, 2), similarity (M,))
+    pairs, sims = [], []
+    for i0, j0, S in similarity_blocks(X, block_size=block_size, stats=stats, triangle=True): 
+        if i0 == j0: 
+            S = np.where(np.triu(np.ones(S.shape, dtype=bool), k=1), S, -np.inf)  # hanya i < j
+        r, c = np.nonzero(S >= threshold)
+        pairs.append(np.stack([r + i0, c + j0], axis=1))
+        sims.append(S[r, c])
+    if not pairs: 
+        return np.zeros((0, 2), dtype=np.int64), np.zeros(0, dtype=np.float32)
+    return np.concatenate(pairs), np.concatenate(sims)
+ 
+if __name__ == "__main__": 
+    # Benchmark startup: tiap skenario dijalankan di proses baru
+    import subprocess, sys, time
+ 
+    def run(code): 
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+ 
+    timed = "import time; t0 = time.perf_counter(); {}; print(f'{{(time.perf_counter() - t0) * 1000:.0f}}')"
+    first_call = ("import time, torch, utils_facenet as u; u.get_embedder(); {}"
+                  "x = torch.randn(3, 160, 160); t0 = time.perf_counter(); u.embed_face_tensor(x); "
+                  "t1 = time.perf_counter(); u.embed_face_tensor(x); t2 = time.perf_counter(); "
+                  "print(f'{{(t1 - t0) * 1000:.0f}} {{(t2 - t1) * 1000:.0f}}')")
+ 
+    print("import utils_facenet           :", run(timed.format("import utils_facenet")), "ms")
+    print("import + get_mtcnn + embedder  :", run(timed.format(
+        "import utils_facenet as u; u.get_mtcnn(); u.get_embedder()")), "ms")
+    cold, steady = run(first_call.format("")).split()
+    print(f"Inferensi pertama tanpa warmup : {cold} ms (berikutnya {steady} ms)")
+    cold, steady = run(first_call.format("u.warmup(); ")).split()
+    print(f"Inferensi pertama dengan warmup: {cold} ms (berikutnya {steady} ms)")
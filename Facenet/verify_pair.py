@@ -1,17 +1,102 @@
-from utils_facenet import embed_from_path, cosine_similarity
+import os, glob, time, itertools, argparse
+import numpy as np
+from utils_facenet import embed_images, normalize_rows
 
-# Sesuaikan dengan struktur kamu
-img1 = "data/train/Andika/a1.jpg"
-img2 = "data/train/Zalda/z1.jpg"
+def read_pairs(path):
+    # Satu pasangan per baris: "img1 img2 [1|0]". Tanpa label -> genuine jika folder sama
+    pairs = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if not parts or parts[0].startswith("#"):
+                continue
+            a, b = parts[:2]
+            same = int(parts[2]) == 1 if len(parts) > 2 else os.path.dirname(a) == os.path.dirname(b)
+            pairs.append((a, b, same))
+    return pairs
 
-emb1 = embed_from_path(img1)
-emb2 = embed_from_path(img2)
+def all_pairs(root, max_impostor=None, seed=0):
+    # Semua pasangan genuine (folder sama) + impostor (folder beda) dari data/val
+    paths = sorted(glob.glob(os.path.join(root, "*", "*")))
+    pairs = [(a, b, os.path.dirname(a) == os.path.dirname(b)) for a, b in itertools.combinations(paths, 2)]
+    genuine = [p for p in pairs if p[2]]
+    impostor = [p for p in pairs if not p[2]]
+    if max_impostor is not None and len(impostor) > max_impostor:
+        rng = np.random.default_rng(seed)
+        impostor = [impostor[i] for i in sorted(rng.choice(len(impostor), max_impostor, replace=False))]
+    return genuine + impostor
 
-if emb1 is None or emb2 is None:
-    print("❌ Wajah tidak terdeteksi pada salah satu gambar.")
-else:
-    sim = cosine_similarity(emb1, emb2)
-    print("Cosine similarity:", sim)
+def sweep(scores, same, thresholds):
+    # FAR = impostor yang lolos, FRR = genuine yang ditolak, untuk setiap threshold
+    gen, imp = np.sort(scores[same]), np.sort(scores[~same])
+    thresholds = np.asarray(thresholds, dtype=scores.dtype)
+    far = 1.0 - np.searchsorted(imp, thresholds) / len(imp) if len(imp) else np.zeros(len(thresholds))
+    frr = np.searchsorted(gen, thresholds) / len(gen) if len(gen) else np.zeros(len(thresholds))
+    return far, frr
 
-    threshold = 0.85
-    print("Match?", "YA" if sim >= threshold else "TIDAK")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verifikasi pasangan wajah + sweep threshold (FAR/FRR/EER)")
+    parser.add_argument("images", nargs="*", help="Dua gambar untuk dibandingkan (mode satu pasangan)")
+    parser.add_argument("--pairs", help="File daftar pasangan: img1 img2 [1|0]")
+    parser.add_argument("--val", help="Buat semua pasangan genuine & impostor dari folder ini (mis. data/val)")
+    parser.add_argument("--max-impostor", type=int, default=None, help="Sampling pasangan impostor")
+    parser.add_argument("--threshold", type=float, default=0.85)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--scores", help="Tulis skor setiap pasangan ke file CSV")
+    args = parser.parse_args()
+
+    if not args.pairs and not args.val:
+        # Sesuaikan dengan struktur kamu
+        img1, img2 = args.images or ["data/train/Andika/a1.jpg", "data/train/Zalda/z1.jpg"]
+        index, E = embed_images([img1, img2])
+        if len(index) < 2:
+            print("❌ Wajah tidak terdeteksi pada salah satu gambar.")
+        else:
+            E = normalize_rows(E)
+            sim = float(E[0] @ E[1])
+            print("Cosine similarity:", sim)
+            print("Match?", "YA" if sim >= args.threshold else "TIDAK")
+        raise SystemExit
+
+    pairs = read_pairs(args.pairs) if args.pairs else all_pairs(args.val, args.max_impostor)
+    unique = sorted({p for a, b, _ in pairs for p in (a, b)})
+    print(f"{len(pairs)} pasangan, {len(unique)} gambar unik (bukan {2 * len(pairs)} embedding)")
+
+    t0 = time.perf_counter()
+    index, E = embed_images(unique, args.batch_size)
+    t_embed = time.perf_counter() - t0
+
+    pairs = [(a, b, same) for a, b, same in pairs if a in index and b in index]
+    if not pairs:
+        raise SystemExit("❌ Tidak ada pasangan yang kedua wajahnya terdeteksi")
+    ia = np.array([index[a] for a, _, _ in pairs])
+    ib = np.array([index[b] for _, b, _ in pairs])
+    same = np.array([s for _, _, s in pairs])
+
+    t0 = time.perf_counter()
+    E = normalize_rows(E)
+    scores = np.einsum("ij,ij->i", E[ia], E[ib])
+    t_score = time.perf_counter() - t0
+
+    thresholds = np.round(np.arange(0.0, 1.0001, 0.01), 2)
+    far, frr = sweep(scores, same, thresholds)
+    eer_i = int(np.argmin(np.abs(far - frr)))
+
+    print(f"\nGenuine: {same.sum()}  Impostor: {(~same).sum()}")
+    print(f"{'threshold':>10}{'FAR':>9}{'FRR':>9}")
+    for t, a, r in zip(thresholds, far, frr):
+        if round(t * 100) % 5 == 0:
+            print(f"{t:>10.2f}{a:>9.4f}{r:>9.4f}")
+    print(f"\nEER ≈ {(far[eer_i] + frr[eer_i]) / 2:.4f} pada threshold {thresholds[eer_i]:.2f}")
+    cur = sweep(scores, same, [args.threshold])
+    print(f"Threshold {args.threshold}: FAR {cur[0][0]:.4f}, FRR {cur[1][0]:.4f}")
+    print(f"\nEmbedding: {len(index)} gambar dalam {t_embed:.2f} detik ({len(index) / max(t_embed, 1e-9):.1f} img/detik)")
+    print(f"Skoring  : {len(pairs)} pasangan dalam {t_score * 1000:.2f} ms "
+          f"({len(pairs) / max(t_score, 1e-9):,.0f} pasangan/detik)")
+
+    if args.scores:
+        with open(args.scores, "w", encoding="utf-8") as f:
+            f.write("img1,img2,same,score\n")
+            for (a, b, s), score in zip(pairs, scores):
+                f.write(f"{a},{b},{int(s)},{score:.6f}\n")
+        print("Skor ditulis ke", args.scores)
@@ -0,0 +1,308 @@
+# ann_index.py - Approximate nearest neighbour (IVF) untuk galeri besar
+import threading
+
+import numpy as np
+
+
+class IVFIndex:
+    """
+    Inverted-file index sederhana (tanpa library luar).
+
+    Galeri dibagi ke `nlist` cluster dengan spherical k-means. Setiap cluster
+    menyimpan daftar baris galerinya (inverted list), jadi saat mencari probe
+    hanya dibandingkan dengan baris di `nprobe` cluster terdekat, tanpa scan
+    assignment seluruh galeri.
+    - nprobe lebih besar  -> recall naik, latency naik
+    - nlist lebih besar   -> cluster lebih kecil, latency turun, recall turun
+    Untuk galeri lebih kecil dari `min_gallery`, pencarian tetap exact.
+
+    Dengan background=True (default) k-means berjalan di thread terpisah:
+    selama training, pencarian tetap memakai centroid lama (atau exact search
+    jika belum pernah dilatih), dan hasilnya dipasang oleh thread pemilik
+    galeri pada add / search berikutnya. Baris yang berubah selama training
+    dicatat lalu di-assign ulang saat hasil dipasang.
+    """
+
+    def __init__(self, nlist: int = 0, nprobe: int = 8, min_gallery: int = 2000,
+                 train_sample: int = 10000, kmeans_iter: int = 10, seed: int = 0,
+                 background: bool = True):
+        self.nlist = nlist  # 0 = otomatis (sqrt jumlah wajah)
+        self.nprobe = nprobe
+        self.min_gallery = min_gallery
+        self.train_sample = train_sample
+        self.kmeans_iter = kmeans_iter
+        self.seed = seed
+        self.background = background
+
+        self.centroids = None
+        self._assign = np.zeros(0, dtype=np.int32)  # cluster tiap baris galeri (-1 = tidak ada)
+        self._pos = np.zeros(0, dtype=np.int32)  # posisi baris di inverted list cluster-nya
+        self._lists = []  # baris galeri per cluster, kapasitas tumbuh 2x
+        self._sizes = np.zeros(0, dtype=np.int64)  # jumlah baris terisi per list
+        self._trained_size = 0
+
+        self._epoch = 0  # naik setiap reset(); hasil training epoch lama dibuang
+        self._training = None  # thread training yang sedang berjalan
+        self._result = None  # (epoch, centroids, assign, n, take) dari thread training
+        self._touched = set()  # baris yang berubah selama training background
+        self._dropped = set()  # baris yang dihapus selama training background
+        self._state_lock = threading.Lock()  # search bisa berjalan paralel di banyak thread
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def should_search(self, gallery_size: int):
+        """Pakai ANN hanya jika sudah dilatih dan galeri cukup besar"""
+        return self.is_trained and gallery_size >= self.min_gallery
+
+    @property
+    def is_training(self):
+        return self._training is not None
+
+    def reset(self):
+        self.centroids = None
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._pos = np.zeros(0, dtype=np.int32)
+        self._lists = []
+        self._sizes = np.zeros(0, dtype=np.int64)
+        self._trained_size = 0
+        self._epoch += 1
+        self._result = None
+        self._touched = set()
+        self._dropped = set()
+
+    @staticmethod
+    def _nearest_to(centroids, vectors):
+        return np.argmax(np.atleast_2d(vectors) @ centroids.T, axis=1).astype(np.int32)
+
+    def _nearest(self, vectors):
+        """Cluster terdekat untuk vektor (d,) atau (n, d)"""
+        return self._nearest_to(self.centroids, vectors)
+
+    def _assign_all(self, centroids, take, n, block: int = 4096):
+        """Cluster untuk seluruh galeri, dibaca per blok lewat `take`"""
+        result = np.empty(n, dtype=np.int32)
+        for start in range(0, n, block):
+            stop = min(start + block, n)
+            result[start:stop] = self._nearest_to(centroids, take(slice(start, stop)))
+        return result
+
+    def train(self, take, n):
+        """
+        Latih sinkron (benchmark / rebuild eksplisit) lalu langsung dipakai.
+        `take(rows)` mengembalikan baris galeri sebagai float32.
+        """
+        self._use(*self._fit(take, n))
+        self._trained_size = n
+
+    def _use(self, centroids, assign):
+        """Pasang centroid + assignment, lalu susun inverted list per cluster"""
+        live = np.flatnonzero(assign >= 0)
+        order = live[np.argsort(assign[live], kind="stable")]
+        counts = np.bincount(assign[live], minlength=len(centroids))
+        starts = np.cumsum(counts) - counts
+        pos = np.zeros(len(assign), dtype=np.int32)
+        pos[order] = np.arange(len(order)) - np.repeat(starts, counts)
+
+        self._lists = [rows.astype(np.int32) for rows in np.split(order, np.cumsum(counts)[:-1])]
+        self._sizes = counts.astype(np.int64)
+        self.centroids = centroids
+        self._assign = assign
+        self._pos = pos
+
+    def _ensure_row(self, row):
+        if row < len(self._assign):
+            return
+        size = max(row + 1, len(self._assign) * 2)
+        assign = np.full(size, -1, dtype=np.int32)
+        assign[:len(self._assign)] = self._assign
+        pos = np.zeros(size, dtype=np.int32)
+        pos[:len(self._pos)] = self._pos
+        self._assign, self._pos = assign, pos
+
+    def _link(self, row, cluster):
+        """Tambahkan baris ke akhir inverted list cluster"""
+        rows = self._lists[cluster]
+        size = self._sizes[cluster]
+        if size == len(rows):
+            grown = np.empty(max(8, 2 * size), dtype=np.int32)
+            grown[:size] = rows
+            self._lists[cluster] = rows = grown
+        rows[size] = row
+        self._pos[row] = size
+        self._sizes[cluster] = size + 1
+        self._assign[row] = cluster
+
+    def _unlink(self, row):
+        """Keluarkan baris dari inverted list-nya (diganti elemen terakhir list)"""
+        if row >= len(self._assign) or self._assign[row] < 0:
+            return
+        cluster = self._assign[row]
+        rows = self._lists[cluster]
+        last = self._sizes[cluster] - 1
+        rows[self._pos[row]] = rows[last]
+        self._pos[rows[last]] = self._pos[row]
+        self._sizes[cluster] = last
+        self._assign[row] = -1
+
+    def _fit(self, take, n):
+        """Spherical k-means pada sampel galeri + assignment semua baris (tanpa mengubah index)"""
+        nlist = self.nlist or int(np.sqrt(n))
+        nlist = max(1, min(nlist, n))
+
+        rng = np.random.default_rng(self.seed)
+        sample_idx = rng.choice(n, size=min(n, self.train_sample), replace=False)
+        sample = take(np.sort(sample_idx))
+
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(self.kmeans_iter):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            onehot = np.zeros((nlist, len(sample)), dtype=np.float32)
+            onehot[assign, np.arange(len(sample))] = 1.0
+            sums = onehot @ sample
+
+            # Cluster kosong tetap memakai centroid lama
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            sums[empty] = centroids[empty]
+
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = sums / norms
+
+        centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        return centroids, self._assign_all(centroids, take, n)
+
+    def maybe_train(self, take, n):
+        """
+        Latih (ulang) jika galeri sudah melewati min_gallery dan ukurannya
+        sudah dua kali lipat sejak training terakhir. Jadi retrain jarang terjadi.
+        Dipanggil dari thread pemilik galeri; training background tidak memegang
+        lock galeri, jadi recognition tidak ikut tertahan.
+        """
+        self._install()
+        if n < self.min_gallery or self.is_training:
+            return False
+        if self.is_trained and n < 2 * self._trained_size:
+            return False
+        if not self.background:
+            self.train(take, n)
+            return True
+
+        with self._state_lock:
+            if self._training is not None:
+                return False
+            epoch = self._epoch
+            self._touched = set()
+            self._training = threading.Thread(
+                target=self._run_training, args=(epoch, take, n), name="ivf-train", daemon=True
+            )
+        self._training.start()
+        return True
+
+    def _run_training(self, epoch, take, n):
+        try:
+            centroids, assign = self._fit(take, n)
+            self._result = (epoch, centroids, assign, n, take)
+        except Exception as e:
+            # Galeri dibangun ulang di tengah training: hasilnya memang dibuang
+            if epoch == self._epoch:
+                print(f"⚠️ Training IVF gagal: {e}")
+        finally:
+            self._training = None
+
+    def _install(self):
+        """Pasang hasil training background (dari thread pemanggil add / search)"""
+        if self._result is None:
+            return False
+        with self._state_lock:
+            return self._install_locked()
+
+    def _install_locked(self):
+        result, self._result = self._result, None
+        if result is None:
+            return False
+        epoch, centroids, assign, n, take = result
+        touched, self._touched = self._touched, set()
+        dropped, self._dropped = self._dropped, set()
+        if epoch != self._epoch:
+            return False
+
+        size = max([n] + [row + 1 for row in touched])
+        if size > n:
+            assign = np.concatenate([assign, np.full(size - n, -1, dtype=np.int32)])
+        if touched:
+            rows = np.array(sorted(touched))
+            assign[rows] = self._nearest_to(centroids, take(rows))
+        dropped = [row for row in dropped if row < size]
+        if dropped:
+            assign[dropped] = -1
+
+        self._use(centroids, assign)
+        self._trained_size = n
+        return True
+
+    def wait(self, timeout: float = None):
+        """Tunggu training background selesai lalu pasang hasilnya"""
+        thread = self._training
+        if thread is not None:
+            thread.join(timeout)
+        return self._install()
+
+    def _track(self, row, dropped: bool = False):
+        if self._training is not None or self._result is not None:
+            with self._state_lock:
+                # Perubahan terakhir yang berlaku saat hasil training dipasang
+                (self._dropped if dropped else self._touched).add(row)
+                (self._touched if dropped else self._dropped).discard(row)
+
+    def add(self, row: int, vector):
+        """Masukkan (atau pindahkan) satu baris ke cluster terdekat"""
+        self._track(row)
+        if not self.is_trained:
+            return
+        self._ensure_row(row)
+        self._unlink(row)
+        self._link(row, self._nearest(vector)[0])
+
+    def move(self, src: int, dst: int):
+        """Ikuti perpindahan baris di galeri (swap saat remove): dst menggantikan src"""
+        self._track(dst)
+        self._track(src, dropped=True)
+        if not self.is_trained:
+            return
+        self._unlink(dst)
+        cluster = self._assign[src] if src < len(self._assign) else -1
+        if cluster >= 0:
+            self._lists[cluster][self._pos[src]] = dst
+            self._pos[dst] = self._pos[src]
+            self._assign[dst] = cluster
+            self._assign[src] = -1
+
+    def remove(self, row: int):
+        """Keluarkan baris terakhir galeri yang dihapus tanpa swap"""
+        self._track(row, dropped=True)
+        if self.is_trained:
+            self._unlink(row)
+
+    def search(self, score_rows, n, probe, nprobe: int = None, block: int = 1024):
+        """
+        Return (index baris kandidat, similarity) untuk cluster terdekat saja.
+        `score_rows(rows, probe)` menghitung skor baris galeri; kandidat
+        diproses per blok supaya tidak menyalin semuanya sekaligus.
+        """
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+
+        centroid_scores = self.centroids @ probe
+        probe_lists = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+
+        # Hanya inverted list cluster yang di-probe yang digabung
+        candidates = np.concatenate([self._lists[c][:self._sizes[c]] for c in probe_lists])
+        candidates = candidates[candidates < n]
+        scores = np.empty(len(candidates), dtype=np.float32)
+        for start in range(0, len(candidates), block):
+            rows = candidates[start:start + block]
+            scores[start:start + block] = score_rows(rows, probe)
+
+        return candidates, scores
@@ -0,0 +1,169 @@
+# benchmark.py - Benchmark pencocokan galeri dengan data sintetis
+# Contoh: python benchmark.py ann --size 50000 --nprobe 8
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import cv2
+import numpy as np
+
+from gallery_index import GalleryIndex
+from ann_index import IVFIndex
+
+
+def make_gallery(size, dim, clusters=256, noise=0.5, seed=0):
+    """Buat galeri sintetis yang berkelompok (mirip wajah dengan pose berbeda)"""
+    rng = np.random.default_rng(seed)
+    centers = rng.random((clusters, dim), dtype=np.float32)
+    labels = rng.integers(0, clusters, size)
+    gallery = centers[labels] + noise * rng.random((size, dim), dtype=np.float32)
+    return gallery, rng
+
+
+def make_queries(gallery, rng, count=200, noise=0.2):
+    """Probe = wajah di galeri + sedikit noise"""
+    idx = rng.choice(len(gallery), size=count, replace=False)
+    queries = gallery[idx] + noise * rng.random((count, gallery.shape[1]), dtype=np.float32)
+    return queries
+
+
+def timed_search(index, queries, **kwargs):
+    """Return (hasil top-1, latency rata-rata dalam ms)"""
+    results = []
+    start = time.perf_counter()
+    for q in queries:
+        results.append(index.search(q, top_k=1, **kwargs)[0][0])
+    elapsed = (time.perf_counter() - start) / len(queries) * 1000
+    return results, elapsed
+
+
+def bench_quant(args):
+    gallery, rng = make_gallery(args.size, args.dim)
+    queries = make_queries(gallery, rng, args.queries)
+    encodings = {i: vec for i, vec in enumerate(gallery)}
+
+    reference = GalleryIndex()
+    reference.rebuild(encodings)
+    exact, exact_ms = timed_search(reference, queries)
+    print(f"Galeri: {args.size} x {args.dim}")
+    print(f"float32: {reference.nbytes / 1e6:8.1f} MB, {exact_ms:.2f} ms/probe")
+
+    for dtype in ("float16", "int8"):
+        index = GalleryIndex(dtype=dtype, rerank=args.rerank, rerank_source=encodings.__getitem__)
+        index.rebuild(encodings)
+        approx, ms = timed_search(index, queries)
+        recall = np.mean([a == e for a, e in zip(approx, exact)])
+        ratio = reference.nbytes / index.nbytes
+        print(f"{dtype:<7}: {index.nbytes / 1e6:8.1f} MB ({ratio:.1f}x lebih kecil), "
+              f"{ms:.2f} ms/probe, recall@1={recall:.3f}")
+
+
+def bench_ann(args):
+    gallery, rng = make_gallery(args.size, args.dim)
+    queries = make_queries(gallery, rng, args.queries)
+
+    # Training sinkron: centroid harus siap sebelum pengukuran
+    ann = IVFIndex(nlist=args.nlist, nprobe=args.nprobe, min_gallery=0, background=False)
+    index = GalleryIndex(ann=ann)
+    index.rebuild({i: vec for i, vec in enumerate(gallery)})
+
+    exact, exact_ms = timed_search(index, queries, exact=True)
+    print(f"Galeri: {args.size} x {args.dim}, nlist={len(ann.centroids)}")
+    print(f"Exact : {exact_ms:.2f} ms/probe")
+
+    for nprobe in sorted({1, args.nprobe // 2 or 1, args.nprobe, args.nprobe * 2}):
+        approx, ann_ms = timed_search(index, queries, nprobe=nprobe)
+        recall = np.mean([a == e for a, e in zip(approx, exact)])
+        print(f"IVF nprobe={nprobe:<3}: {ann_ms:.2f} ms/probe, recall@1={recall:.3f}")
+
+
+def make_faces(count, size=100, seed=0):
+    """Wajah sintetis: pola acak yang di-blur (satu pola per identitas)"""
+    rng = np.random.default_rng(seed)
+    faces = rng.integers(0, 256, (count, size, size), dtype=np.uint8)
+    return np.stack([cv2.GaussianBlur(face, (5, 5), 1.5) for face in faces]), rng
+
+
+def perturb(face, rng, noise=12, shift=2):
+    """Probe = wajah galeri yang sedikit bergeser + noise"""
+    dx, dy = rng.integers(-shift, shift + 1, 2)
+    moved = np.roll(face, (int(dy), int(dx)), axis=(0, 1)).astype(np.int16)
+    moved += rng.integers(-noise, noise + 1, face.shape, dtype=np.int16)
+    return np.clip(moved, 0, 255).astype(np.uint8)
+
+
+def bench_lbph(args):
+    # Tanpa face_recognition_simple: import itu membuat face_system global
+    # yang me-load (dan bisa memigrasi) file model asli di models/
+    from face_backends import extract_pixel_features
+    from lbph_engine import LBPHEngine
+
+    # File model LBPH di folder sementara sendiri, bukan path tetap di /tmp
+    model_dir = tempfile.mkdtemp(prefix="benchmark_lbph_")
+    for size in args.sizes:
+        faces, rng = make_faces(size)
+        probe_idx = rng.choice(size, size=min(args.queries, size), replace=False)
+        probes = [perturb(faces[i], rng) for i in probe_idx]
+        print(f"\n{size} identitas, {len(probes)} probe")
+
+        # Cosine di atas fitur piksel + histogram (engine default)
+        start = time.perf_counter()
+        features = extract_pixel_features(list(faces))
+        index = GalleryIndex()
+        index.rebuild({i: vec for i, vec in enumerate(features)})
+        len(index)
+        enroll_ms = (time.perf_counter() - start) / size * 1000
+
+        start = time.perf_counter()
+        hits = 0
+        for i, probe in zip(probe_idx, probes):
+            vec = extract_pixel_features([probe])[0]
+            hits += index.search(vec, top_k=1)[0][0] == i
+        ms = (time.perf_counter() - start) / len(probes) * 1000
+        print(f"cosine: {index.nbytes / 1e6:8.1f} MB, enroll {enroll_ms:.2f} ms/wajah, "
+              f"{ms:.2f} ms/probe, akurasi={hits / len(probes):.3f}")
+
+        # LBPH, registrasi satu per satu lewat update()
+        engine = LBPHEngine(model_path=os.path.join(model_dir, f"lbph_{size}.yml"))
+        start = time.perf_counter()
+        for i, face in enumerate(faces):
+            engine.add(i, face)
+        enroll_ms = (time.perf_counter() - start) / size * 1000
+
+        start = time.perf_counter()
+        hits = 0
+        for i, probe in zip(probe_idx, probes):
+            hits += engine.predict(probe)[0] == i
+        ms = (time.perf_counter() - start) / len(probes) * 1000
+        print(f"lbph  : {engine.nbytes / 1e6:8.1f} MB, enroll {enroll_ms:.2f} ms/wajah, "
+              f"{ms:.2f} ms/probe, akurasi={hits / len(probes):.3f}")
+    shutil.rmtree(model_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark pencocokan galeri wajah")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    p_ann = sub.add_parser("ann", help="Recall & latency IVF vs exact search")
+    p_ann.add_argument("--size", type=int, default=20000)
+    p_ann.add_argument("--dim", type=int, default=10263)
+    p_ann.add_argument("--queries", type=int, default=200)
+    p_ann.add_argument("--nlist", type=int, default=0)
+    p_ann.add_argument("--nprobe", type=int, default=8)
+    p_ann.set_defaults(func=bench_ann)
+
+    p_quant = sub.add_parser("quant", help="Memori & recall galeri float16/int8")
+    p_quant.add_argument("--size", type=int, default=5000)
+    p_quant.add_argument("--dim", type=int, default=10263)
+    p_quant.add_argument("--queries", type=int, default=200)
+    p_quant.add_argument("--rerank", type=int, default=32)
+    p_quant.set_defaults(func=bench_quant)
+
+    p_lbph = sub.add_parser("lbph", help="Latency & memori LBPH vs cosine")
+    p_lbph.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    p_lbph.add_argument("--queries", type=int, default=50)
+    p_lbph.set_defaults(func=bench_lbph)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -19,12 +19,47 @@ class Settings:
     ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 jam
     
     # Face Recognition
-    FACE_MODEL_PATH = "models/facenet.pth"
+    FACE_BACKEND = os.getenv("FACE_BACKEND", "pixel")  # pixel / facenet (butuh torch + facenet-pytorch)
+    FACE_MODEL_PATH = os.getenv("FACE_MODEL_PATH", "models/facenet.pth")  # bobot InceptionResnetV1 (opsional)
+    FACENET_THRESHOLD = float(os.getenv("FACENET_THRESHOLD", 0.7))  # cosine minimal untuk embedding FaceNet
+    FACENET_BATCH_SIZE = int(os.getenv("FACENET_BATCH_SIZE", 16))  # wajah maksimal per forward pass gabungan
+    FACENET_BATCH_WAIT_MS = float(os.getenv("FACENET_BATCH_WAIT_MS", 5))  # tunggu request lain sebelum forward
     SVM_MODEL_PATH = "models/face_classifier.joblib"
     FACE_DETECTION_THRESHOLD = 0.6
-    MIN_FACE_SIZE = 30
+    MIN_FACE_SIZE = 30  # px pada gambar asli
+    DETECTION_MAX_SIZE = int(os.getenv("DETECTION_MAX_SIZE", 640))  # sisi terpanjang saat deteksi, 0 = resolusi penuh
+    DETECTION_MIN_FACE_RATIO = float(os.getenv("DETECTION_MIN_FACE_RATIO", 0.05))  # wajah minimal relatif sisi terpendek
     EMBEDDING_SIZE = 512
     
+    # Engine recognition: cosine (fitur piksel + histogram) / lbph (butuh opencv-contrib)
+    RECOGNITION_ENGINE = os.getenv("RECOGNITION_ENGINE", "cosine")
+    LBPH_MAX_DISTANCE = float(os.getenv("LBPH_MAX_DISTANCE", 200))  # similarity = 1 - jarak / nilai ini
+    
+    # Approximate nearest neighbour (IVF) untuk galeri besar
+    ANN_ENABLED = os.getenv("ANN_ENABLED", "True") == "True"
+    ANN_NLIST = int(os.getenv("ANN_NLIST", 0))  # 0 = otomatis (sqrt jumlah wajah)
+    ANN_NPROBE = int(os.getenv("ANN_NPROBE", 8))  # naikkan untuk recall lebih tinggi
+    ANN_MIN_GALLERY = int(os.getenv("ANN_MIN_GALLERY", 2000))  # di bawah ini pakai exact search
+    
+    # Penyimpanan galeri: float32 / float16 / int8 (hemat RAM, + re-ranking exact).
+    # float16: exact search ~4x lebih lambat dari float32 (konversi per blok); int8 tidak
+    GALLERY_DTYPE = os.getenv("GALLERY_DTYPE", "float32")
+    GALLERY_RERANK = int(os.getenv("GALLERY_RERANK", 32))  # jumlah kandidat yang dihitung ulang
+    JOURNAL_COMPACT_EVERY = int(os.getenv("JOURNAL_COMPACT_EVERY", 500))  # record journal sebelum snapshot baru
+    
+    # Worker pool untuk recognition, decode gambar dan database
+    WORKER_POOL_TYPE = os.getenv("WORKER_POOL_TYPE", "thread")  # thread / process
+    WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", 4))
+    OPENCV_THREADS = int(os.getenv("OPENCV_THREADS", 1))  # thread OpenCV per worker
+    TORCH_THREADS = int(os.getenv("TORCH_THREADS", 0))  # thread torch per worker (0 = core / WORKER_POOL_SIZE)
+    READ_ONLY = os.getenv("FACE_READ_ONLY", "False") == "True"  # face_system hanya membaca (diset workers.py untuk worker proses)
+    
+    # Video / kamera: deteksi periodik + tracking di antaranya
+    VIDEO_DETECT_EVERY = int(os.getenv("VIDEO_DETECT_EVERY", 5))  # deteksi penuh tiap N frame
+    VIDEO_TRACK_MIN_SCORE = float(os.getenv("VIDEO_TRACK_MIN_SCORE", 0.5))  # skor template matching minimal
+    VIDEO_RECHECK_EVERY = int(os.getenv("VIDEO_RECHECK_EVERY", 15))  # coba ulang track yang belum dikenali
+    VIDEO_MAX_MISSED = int(os.getenv("VIDEO_MAX_MISSED", 2))  # deteksi berturut-turut tanpa pasangan
+    
     # Paths
     UPLOAD_DIR = "uploads"
     STUDENT_IMAGES_DIR = "uploads/students"
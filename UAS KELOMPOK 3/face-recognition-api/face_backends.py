@@ -0,0 +1,220 @@
+# face_backends.py - Backend ekstraksi fitur wajah untuk SimpleFaceRecognition
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+from config import settings
+
+
+def extract_pixel_features(gray_rois):
+    """
+    Ekstrak fitur banyak wajah sekaligus (versi batch extract_face_features)
+    Input: list crop wajah grayscale. Output: matriks (jumlah wajah, dim fitur)
+    """
+    try:
+        count = len(gray_rois)
+
+        # Resize semua ROI lalu normalisasi dalam satu operasi
+        resized = np.stack([cv2.resize(roi, (100, 100)) for roi in gray_rois])
+        normalized = resized.reshape(count, -1) / 255.0
+
+        # Histogram semua ROI dengan satu bincount (offset 256 per wajah)
+        offsets = np.concatenate([
+            np.full(roi.size, i * 256, dtype=np.int64) for i, roi in enumerate(gray_rois)
+        ])
+        pixels = np.concatenate([roi.ravel() for roi in gray_rois])
+        hist = np.bincount(pixels + offsets, minlength=count * 256).reshape(count, 256)
+        totals = hist.sum(axis=1, keepdims=True)
+        hist = hist / np.where(totals > 0, totals, 1)
+
+        hu_moments = np.stack([
+            cv2.HuMoments(cv2.moments(roi)).flatten() for roi in gray_rois
+        ])
+
+        return np.hstack([normalized, hist, hu_moments])
+
+    except Exception as e:
+        print(f"Error extracting batch features: {e}")
+        return None
+
+
+def torch_threads():
+    """
+    Thread intra-op torch per worker: TORCH_THREADS, atau core dibagi
+    WORKER_POOL_SIZE supaya forward pass paralel tidak oversubscribe CPU
+    (sama seperti OPENCV_THREADS untuk OpenCV).
+    """
+    if settings.TORCH_THREADS > 0:
+        return settings.TORCH_THREADS
+    if settings.WORKER_POOL_TYPE == "thread":
+        # Forward pass dijalankan satu per satu oleh ForwardBatcher di proses ini
+        return os.cpu_count() or 1
+    return max(1, (os.cpu_count() or 1) // max(1, settings.WORKER_POOL_SIZE))
+
+
+class ForwardBatcher:
+    """
+    Micro-batching forward pass (seperti Facenet/batcher.py): wajah dari
+    request yang berjalan bersamaan di worker pool digabung jadi satu batch.
+    Batch dikirim jika sudah max_batch wajah atau max_wait_ms sejak request
+    pertama; selama forward berjalan, request baru menumpuk untuk batch berikutnya.
+    """
+
+    def __init__(self, forward, max_batch: int = 16, max_wait_ms: float = 5):
+        self.forward = forward
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def run(self, faces):
+        """Embedding untuk array wajah (N, 3, 160, 160), blocking sampai batch-nya selesai"""
+        future = Future()
+        self.queue.put((faces, future))
+        return future.result()
+
+    def _collect(self):
+        items = [self.queue.get()]
+        count = len(items[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while count < self.max_batch:
+            try:
+                item = self.queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                break
+            items.append(item)
+            count += len(item[0])
+        return items
+
+    def _loop(self):
+        while True:
+            items = self._collect()
+            try:
+                embs = self.forward(np.concatenate([faces for faces, _ in items]))
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            start = 0
+            for faces, future in items:
+                future.set_result(embs[start:start + len(faces)])
+                start += len(faces)
+
+
+class PixelBackend:
+    """
+    Fitur sederhana: piksel 100x100 + histogram + Hu moments (10.263 dimensi).
+    Tidak butuh library tambahan.
+    """
+
+    name = "pixel"
+    model_path = "models/simple_face_model.json"
+    legacy_path = "models/simple_face_model.pkl"  # snapshot pickle format lama
+    dim = 100 * 100 + 256 + 7
+    threshold = 0.6
+
+    def extract(self, image, gray, faces):
+        """Matriks fitur (jumlah wajah, dim) untuk kotak (x, y, w, h), atau None"""
+        gray_rois = [gray[y:y+h, x:x+w] for (x, y, w, h) in faces]
+        return extract_pixel_features(gray_rois)
+
+
+class FacenetBackend:
+    """
+    Embedding FaceNet (InceptionResnetV1, 512 dimensi), 160x160.
+    Galeri 20x lebih kecil dari fitur piksel, jadi scan juga lebih cepat.
+    Wajah di-align dengan MTCNN (parameter sama dengan pipeline training di
+    Facenet/utils_facenet.py) di sekitar kotak Haar; jika MTCNN tidak
+    menemukan wajah, dipakai crop Haar biasa.
+    Butuh torch + facenet-pytorch. Bobot dibaca dari FACE_MODEL_PATH
+    (state_dict) jika ada, selain itu bobot pretrained vggface2.
+    """
+
+    name = "facenet"
+    model_path = "models/facenet_face_model.json"
+    legacy_path = None
+    image_size = 160
+
+    def __init__(self, weights_path: str = None, margin: float = 0.1, context: float = 0.4):
+        import torch
+        from facenet_pytorch import InceptionResnetV1, MTCNN
+
+        self.torch = torch
+        torch.set_num_threads(torch_threads())
+        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.margin = margin  # tambahan tepi crop Haar cadangan (seperti margin MTCNN)
+        self.context = context  # area di sekitar kotak Haar yang diberikan ke MTCNN
+        self.dim = settings.EMBEDDING_SIZE
+        self.threshold = settings.FACENET_THRESHOLD
+        self.mtcnn = MTCNN(image_size=self.image_size, margin=20, post_process=True, device=self.device)
+
+        weights_path = weights_path or settings.FACE_MODEL_PATH
+        if weights_path and os.path.exists(weights_path):
+            self.model = InceptionResnetV1(pretrained=None)
+            self.model.load_state_dict(torch.load(weights_path, map_location='cpu'))
+        else:
+            self.model = InceptionResnetV1(pretrained='vggface2')
+        self.model.eval().to(self.device)
+
+        if self.model.last_bn.num_features != self.dim:
+            raise ValueError(
+                f"Model menghasilkan embedding {self.model.last_bn.num_features} dimensi, "
+                f"EMBEDDING_SIZE = {self.dim}"
+            )
+        self.batcher = ForwardBatcher(self._forward, settings.FACENET_BATCH_SIZE,
+                                      settings.FACENET_BATCH_WAIT_MS)
+
+    @staticmethod
+    def _expand(box, shape, margin):
+        x, y, w, h = box
+        height, width = shape[:2]
+        mx, my = int(w * margin), int(h * margin)
+        return max(0, x - mx), max(0, y - my), min(width, x + w + mx), min(height, y + h + my)
+
+    def _crop(self, rgb, box):
+        """Crop CHW 160x160 dengan margin, dinormalisasi seperti MTCNN (post_process)"""
+        x0, y0, x1, y1 = self._expand(box, rgb.shape, self.margin)
+        face = cv2.resize(rgb[y0:y1, x0:x1], (self.image_size, self.image_size)).astype(np.float32)
+        return ((face - 127.5) / 128.0).transpose(2, 0, 1)
+
+    def _align(self, rgb, box):
+        """Wajah ter-align MTCNN di sekitar kotak Haar (CHW), atau crop biasa"""
+        x0, y0, x1, y1 = self._expand(box, rgb.shape, self.context)
+        with self.torch.no_grad():
+            face = self.mtcnn(np.ascontiguousarray(rgb[y0:y1, x0:x1]))
+        if face is None:
+            return self._crop(rgb, box)
+        return face.cpu().numpy()
+
+    def _forward(self, batch):
+        # Dipanggil dari thread ForwardBatcher; no_grad berlaku per thread
+        with self.torch.no_grad():
+            tensor = self.torch.from_numpy(np.ascontiguousarray(batch)).to(self.device)
+            return self.model(tensor).cpu().numpy()
+
+    def extract(self, image, gray, faces):
+        """Embedding (jumlah wajah, 512); forward pass digabung dengan request lain lewat batcher"""
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        batch = np.stack([self._align(rgb, box) for box in faces]).astype(np.float32)
+        return self.batcher.run(batch)
+
+
+def create_backend(name: str = None):
+    """Buat backend sesuai FACE_BACKEND; kembali ke pixel jika dependency tidak ada"""
+    name = name or settings.FACE_BACKEND
+    if name == "facenet":
+        try:
+            return FacenetBackend()
+        except ImportError as e:
+            print(f"⚠️ Backend FaceNet butuh torch + facenet-pytorch ({e}). Menggunakan pixel.")
+    elif name != "pixel":
+        print(f"⚠️ FACE_BACKEND tidak dikenal: {name}. Menggunakan pixel.")
+    return PixelBackend()
@@ -2,60 +2,197 @@
 import cv2
 import numpy as np
 import os
-import pickle
-from PIL import Image
 import hashlib
+import threading
+import time
 from datetime import datetime
+from gallery_index import GalleryIndex
+from gallery_store import GalleryStore
+from ann_index import IVFIndex
+from lbph_engine import LBPHEngine
+from face_backends import create_backend, extract_pixel_features
+from config import settings
 
 class SimpleFaceRecognition:
-    def __init__(self):
-        # Face detector menggunakan Haar Cascade
-        self.face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        )
+    CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+    
+    def __init__(self, read_only: bool = False):
+        # Face detector menggunakan Haar Cascade, satu instance per thread (lihat face_cascade)
+        self._local = threading.local()
         
         # Cek apakah opencv-contrib terinstall untuk face module
-        try:
-            self.recognizer = cv2.face.LBPHFaceRecognizer_create()
-            self.has_face_module = True
-        except AttributeError:
+        self.has_face_module = hasattr(cv2, "face")
+        if not self.has_face_module:
             print("⚠️ OpenCV face module tidak tersedia. Menggunakan metode sederhana.")
-            self.recognizer = None
-            self.has_face_module = False
+        
+        # read_only: dipakai worker proses lain, hanya membaca snapshot + journal
+        self.read_only = read_only
+        # Galeri dipakai bersama oleh beberapa thread worker
+        self._lock = threading.RLock()
+        
+        # Backend fitur (pixel / facenet): masing-masing punya galeri, threshold dan file sendiri
+        self.backend = create_backend()
+        self.threshold = self.backend.threshold
         
         self.known_faces = {}  # {face_id: {"name": str, "nim": str}}
         self.face_encodings = {}  # {face_id: face_encoding}
-        self.model_path = "models/simple_face_model.pkl"
+        
+        # Matriks ternormalisasi untuk pencocokan (+ IVF untuk galeri besar)
+        ann = None
+        if settings.ANN_ENABLED:
+            ann = IVFIndex(
+                nlist=settings.ANN_NLIST,
+                nprobe=settings.ANN_NPROBE,
+                min_gallery=settings.ANN_MIN_GALLERY
+            )
+        self.gallery = GalleryIndex(
+            ann=ann,
+            dtype=settings.GALLERY_DTYPE,
+            rerank=settings.GALLERY_RERANK,
+            rerank_source=lambda face_id: self.face_encodings[face_id]
+        )
+        self.model_path = self.backend.model_path
+        
+        # Snapshot memmap + journal append-only (registrasi tidak menulis ulang seluruh model)
+        self.store = GalleryStore(
+            self.model_path,
+            compact_every=settings.JOURNAL_COMPACT_EVERY,
+            legacy_path=self.backend.legacy_path
+        )
+        
+        # Engine LBPH (opsional), model disimpan di samping snapshot galeri
+        self.engine = settings.RECOGNITION_ENGINE
+        self.lbph = None
+        self._lbph_synced_at = None  # crop di dataset/ sampai waktu ini sudah masuk model LBPH
+        if self.engine == "lbph":
+            if self.has_face_module:
+                self.lbph = LBPHEngine(
+                    "models/lbph_model.yml",
+                    max_distance=settings.LBPH_MAX_DISTANCE
+                )
+            else:
+                print("⚠️ Engine LBPH butuh opencv-contrib. Menggunakan cosine.")
+                self.engine = "cosine"
         
         os.makedirs("models", exist_ok=True)
         os.makedirs("dataset", exist_ok=True)
         
         self.load_model()
     
+    @property
+    def face_cascade(self):
+        """
+        CascadeClassifier tidak thread-safe: detectMultiScale paralel dari
+        beberapa thread worker bisa gagal (cv2.error -215). Tiap thread
+        memakai instance sendiri.
+        """
+        cascade = getattr(self._local, "face_cascade", None)
+        if cascade is None:
+            cascade = self._local.face_cascade = cv2.CascadeClassifier(self.CASCADE_PATH)
+        return cascade
+    
     def load_model(self):
         """Load model jika ada"""
         try:
-            if os.path.exists(self.model_path):
-                with open(self.model_path, 'rb') as f:
-                    data = pickle.load(f)
-                    self.known_faces = data.get('known_faces', {})
-                    self.face_encodings = data.get('face_encodings', {})
+            if self.store.exists():
+                legacy = self.store.is_legacy
+                known_faces, face_encodings = self.store.load()
+                with self._lock:
+                    self.known_faces = known_faces
+                    # Template disimpan float32 (cukup presisi, separuh memori float64).
+                    # Dari snapshot .npy nilainya view memmap, jadi tidak ada salinan
+                    self.face_encodings = {
+                        face_id: np.asarray(features, dtype=np.float32)
+                        for face_id, features in face_encodings.items()
+                    }
+                    # Matriks galeri dibangun saat pertama kali dipakai
+                    # (atau langsung memakai memmap index dari snapshot)
+                    self.gallery.rebuild(self.face_encodings, self.store.index)
+                    if self.lbph is not None:
+                        self._sync_lbph()
                 print(f"✅ Loaded {len(self.known_faces)} known faces")
+                
+                if legacy and not self.read_only:
+                    # Migrasi sekali dari pickle lama ke snapshot memmap
+                    self.save_model()
                 return True
         except Exception as e:
             print(f"⚠️ Error loading model: {e}")
         
         return False
     
+    def refresh_model(self):
+        """
+        Ikuti perubahan galeri yang ditulis proses lain (dipakai worker read-only).
+        Cukup dua os.stat jika tidak ada perubahan.
+        """
+        records = self.store.read_new_records()
+        if records is None:
+            return self.load_model()
+        
+        with self._lock:
+            for record in records:
+                self.store.apply(record, self.known_faces, self.face_encodings)
+                face_id = record[1]
+                if record[0] == "enroll":
+                    self.face_encodings[face_id] = np.asarray(record[3], dtype=np.float32)
+                    self.gallery.add(face_id, self.face_encodings[face_id])
+                else:
+                    self.gallery.remove(face_id)
+            if self.lbph is not None and records:
+                self._sync_lbph([record[1] for record in records if record[0] == "enroll"])
+        return bool(records)
+    
+    def _sync_lbph(self, face_ids=None):
+        """
+        Samakan model LBPH dengan galeri. File .yml hanya ditulis saat snapshot
+        (menulis ulang semua histogram tiap registrasi terlalu mahal), jadi
+        registrasi setelahnya dibangun ulang dari crop di dataset/ yang ditulis
+        bersama record journal-nya: wajah baru -> semua crop, wajah yang
+        diregistrasi ulang -> crop yang lebih baru dari sinkronisasi terakhir.
+        Jika model masih berisi wajah yang sudah dihapus, latih ulang.
+        """
+        now = time.time()
+        if len(self.lbph) == 0 and self.lbph.load():
+            self._lbph_synced_at = self.lbph.saved_at
+        
+        if any(face_id not in self.known_faces for face_id in self.lbph.labels):
+            self.lbph.retrain(self._dataset_samples(self.known_faces))
+            self._lbph_synced_at = now
+            return
+        
+        for face_id in (self.known_faces if face_ids is None else face_ids):
+            if face_id not in self.known_faces:
+                continue
+            since = self._lbph_synced_at if face_id in self.lbph else None
+            rois = [roi for _, roi in self._dataset_samples([face_id], since)]
+            if rois:
+                self.lbph.add(face_id, rois)
+        self._lbph_synced_at = now
+    
+    def _dataset_samples(self, face_ids, since: float = None):
+        """Yield (face_id, crop wajah grayscale) dari dataset/{face_id}/ (opsional: mtime > since)"""
+        for face_id in face_ids:
+            folder = f"dataset/{face_id}"
+            if not os.path.isdir(folder):
+                continue
+            for filename in sorted(os.listdir(folder)):
+                path = os.path.join(folder, filename)
+                if since is not None and os.path.getmtime(path) <= since:
+                    continue
+                roi = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+                if roi is not None:
+                    yield face_id, roi
+    
     def save_model(self):
-        """Save model"""
+        """Save model (snapshot penuh + kosongkan journal)"""
+        if self.read_only:
+            return False
         try:
-            data = {
-                'known_faces': self.known_faces,
-                'face_encodings': self.face_encodings
-            }
-            with open(self.model_path, 'wb') as f:
-                pickle.dump(data, f)
+            with self._lock:
+                self.store.write_snapshot(self.known_faces, self.face_encodings, self.gallery)
+                if self.lbph is not None:
+                    self.lbph.save()
             print(f"✅ Model saved with {len(self.known_faces)} faces")
             return True
         except Exception as e:
@@ -99,27 +236,86 @@ class SimpleFaceRecognition:
             print(f"Error extracting features: {e}")
             return None
     
-    def detect_faces(self, image_array):
-        """Deteksi wajah dalam gambar"""
+    @staticmethod
+    def extract_faces_features_batch(gray_rois):
+        """
+        Ekstrak fitur banyak wajah sekaligus (versi batch extract_face_features)
+        Input: list crop wajah grayscale. Output: matriks (jumlah wajah, dim fitur)
+        Implementasi ada di face_backends.extract_pixel_features
+        """
+        return extract_pixel_features(gray_rois)
+    
+    def detect_faces(self, image_array, max_size: int = None):
+        """
+        Deteksi wajah dalam gambar
+        Gambar besar (misal foto HP 12 MP) diperkecil dulu sampai sisi terpanjang
+        = max_size, dideteksi di sana, lalu kotaknya dikembalikan ke koordinat asli.
+        Return (faces dalam koordinat asli, gray resolusi asli untuk crop)
+        """
+        if max_size is None:
+            max_size = settings.DETECTION_MAX_SIZE
+        
         # Convert ke grayscale
         gray = cv2.cvtColor(image_array, cv2.COLOR_BGR2GRAY)
         
+        height, width = gray.shape[:2]
+        scale = 1.0
+        work = gray
+        if max_size and max(height, width) > max_size:
+            scale = max_size / max(height, width)
+            work = cv2.resize(gray, (int(width * scale), int(height * scale)),
+                              interpolation=cv2.INTER_AREA)
+        
+        # minSize ikut skala: MIN_FACE_SIZE (px asli) atau rasio sisi terpendek,
+        # minimal 24 px (ukuran window Haar cascade)
+        min_face = max(
+            24,
+            int(settings.MIN_FACE_SIZE * scale),
+            int(settings.DETECTION_MIN_FACE_RATIO * min(work.shape[:2]))
+        )
+        
         # Deteksi wajah
         faces = self.face_cascade.detectMultiScale(
-            gray,
+            work,
             scaleFactor=1.1,
             minNeighbors=5,
-            minSize=(30, 30),
+            minSize=(min_face, min_face),
             flags=cv2.CASCADE_SCALE_IMAGE
         )
         
+        if scale != 1.0 and len(faces) > 0:
+            # Kembalikan kotak ke koordinat gambar asli
+            faces = np.round(np.asarray(faces) / scale).astype(int)
+            faces[:, 2] = np.minimum(faces[:, 2], width - faces[:, 0])
+            faces[:, 3] = np.minimum(faces[:, 3], height - faces[:, 1])
+        
         return faces, gray
     
+    @staticmethod
+    def decode_image(image):
+        """
+        Terima gambar BGR (ndarray) atau bytes file gambar (JPEG/PNG)
+        Return ndarray BGR, atau None jika tidak valid
+        """
+        if isinstance(image, np.ndarray):
+            return image
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR)
+        return None
+    
     def register_face(self, nim: str, name: str, image_path: str):
-        """Registrasi wajah baru"""
+        """Registrasi wajah baru dari file gambar"""
+        image = cv2.imread(image_path)
+        if image is None:
+            return {"success": False, "message": "Gambar tidak valid"}
+        return self.register_face_image(nim, name, image)
+    
+    def register_face_image(self, nim: str, name: str, image):
+        """Registrasi wajah baru dari gambar yang sudah di-decode (ndarray) atau bytes"""
+        if self.read_only:
+            return {"success": False, "message": "Face system read-only"}
         try:
-            # Baca gambar
-            image = cv2.imread(image_path)
+            image = self.decode_image(image)
             if image is None:
                 return {"success": False, "message": "Gambar tidak valid"}
             
@@ -137,11 +333,12 @@ class SimpleFaceRecognition:
             # Crop wajah
             face_roi = image[y:y+h, x:x+w]
             
-            # Ekstrak fitur
-            features = self.extract_face_features(face_roi)
+            # Ekstrak fitur dengan backend aktif
+            features = self.backend.extract(image, gray, faces[:1])
             
             if features is None:
                 return {"success": False, "message": "Gagal mengekstrak fitur wajah"}
+            features = features[0]
             
             # Generate face ID
             face_id = f"{nim}_{hashlib.md5(name.encode()).hexdigest()[:8]}"
@@ -154,17 +351,23 @@ class SimpleFaceRecognition:
             face_image_path = f"{dataset_path}/{timestamp}.jpg"
             cv2.imwrite(face_image_path, face_roi)
             
-            # Simpan ke memory
-            self.known_faces[face_id] = {
-                "nim": nim,
-                "name": name,
-                "face_id": face_id
-            }
-            
-            self.face_encodings[face_id] = features
-            
-            # Save model
-            self.save_model()
+            with self._lock:
+                # Simpan ke memory
+                self.known_faces[face_id] = {
+                    "nim": nim,
+                    "name": name,
+                    "face_id": face_id
+                }
+                
+                self.face_encodings[face_id] = features.astype(np.float32)
+                self.gallery.add(face_id, features)
+                if self.lbph is not None:
+                    # Incremental: hanya histogram wajah baru yang ditambahkan
+                    self.lbph.add(face_id, gray[y:y+h, x:x+w])
+                
+                # Simpan ke journal (append), snapshot hanya sesekali
+                self.store.append_enroll(face_id, self.known_faces[face_id], self.face_encodings[face_id])
+                self._maybe_compact()
             
             return {
                 "success": True,
@@ -176,6 +379,18 @@ class SimpleFaceRecognition:
         except Exception as e:
             return {"success": False, "message": f"Error: {str(e)}"}
     
+    def _maybe_compact(self):
+        """Gabungkan journal ke snapshot jika journal sudah panjang"""
+        if self.store.needs_compaction():
+            self.save_model()
+    
+    def batch(self):
+        """
+        Context manager untuk registrasi massal: fsync journal sekali di akhir
+        Contoh: with face_system.batch(): ...register_face(...) berkali-kali
+        """
+        return self.store.batch()
+    
     def compare_faces(self, features1, features2, threshold=0.7):
         """
         Bandingkan dua fitur wajah menggunakan cosine similarity
@@ -195,11 +410,121 @@ class SimpleFaceRecognition:
         except:
             return 0
     
-    def recognize_face(self, image_path: str, threshold: float = 0.6):
-        """Mengenali wajah dari gambar"""
+    def match_features(self, features, top_k: int = 3):
+        """
+        Cocokkan satu vektor fitur dengan seluruh galeri sekaligus
+        Return (kandidat top-k, margin antara kandidat pertama dan kedua)
+        """
+        matches = self.gallery.search(features, top_k=max(top_k, 2))
+        return self._format_matches(matches, top_k)
+    
+    def match_features_batch(self, features_matrix, top_k: int = 3):
+        """Cocokkan banyak probe sekaligus (satu perkalian matriks-matriks)"""
+        all_matches = self.gallery.search_batch(features_matrix, top_k=max(top_k, 2))
+        return [self._format_matches(matches, top_k) for matches in all_matches]
+    
+    def match_lbph(self, gray_roi):
+        """Cocokkan satu crop wajah grayscale dengan model LBPH"""
+        face_id, similarity = self.lbph.predict(gray_roi)
+        matches = [(face_id, similarity)] if face_id is not None else []
+        return self._format_matches(matches, 1)
+    
+    def _format_matches(self, matches, top_k):
+        candidates = []
+        for face_id, similarity in matches[:top_k]:
+            face_data = self.known_faces.get(face_id, {})
+            candidates.append({
+                "face_id": face_id,
+                "name": face_data.get("name", "Unknown"),
+                "nim": face_data.get("nim", "unknown"),
+                "similarity": round(similarity, 4)
+            })
+        
+        if len(matches) >= 2:
+            margin = matches[0][1] - matches[1][1]
+        elif matches:
+            margin = matches[0][1]
+        else:
+            margin = 0
+        
+        return candidates, round(margin, 4)
+    
+    def recognize_regions(self, image, gray, faces, threshold: float = None, top_k: int = 3):
+        """
+        Ekstrak fitur + cocokkan wajah pada kotak (x, y, w, h) yang sudah diketahui
+        (hasil deteksi atau tracker). Return list hasil per kotak,
+        atau None jika ekstraksi fitur gagal
+        """
+        if threshold is None:
+            threshold = self.threshold
+        results = []
+        
+        # Crop semua wajah (grayscale)
+        gray_rois = [gray[y:y+h, x:x+w] for (x, y, w, h) in faces]
+        
+        if self.lbph is not None:
+            # LBPH hanya memberi satu kandidat terbaik per wajah
+            with self._lock:
+                all_matches = [self.match_lbph(roi) for roi in gray_rois]
+        else:
+            # Ekstrak fitur semua wajah sekaligus
+            features_matrix = self.backend.extract(image, gray, faces)
+            
+            if features_matrix is None:
+                return None
+            
+            # Bandingkan semua wajah dengan galeri (satu perkalian matriks-matriks)
+            with self._lock:
+                all_matches = self.match_features_batch(features_matrix, top_k=top_k)
+        
+        for (x, y, w, h), (candidates, margin) in zip(faces, all_matches):
+            best_match = None
+            best_similarity = 0
+            if candidates and candidates[0]["similarity"] > 0:
+                best_match = candidates[0]["face_id"]
+                best_similarity = candidates[0]["similarity"]
+            
+            # Check threshold
+            if best_match and best_similarity >= threshold:
+                face_data = self.known_faces.get(best_match, {})
+                
+                results.append({
+                    "success": True,
+                    "name": face_data.get("name", "Unknown"),
+                    "nim": face_data.get("nim", "unknown"),
+                    "confidence": round(best_similarity * 100, 2),
+                    "face_location": (int(x), int(y), int(w), int(h)),
+                    "similarity": round(best_similarity, 4),
+                    "face_id": best_match,
+                    "margin": margin,
+                    "candidates": candidates
+                })
+            else:
+                results.append({
+                    "success": False,
+                    "message": "Wajah tidak dikenali",
+                    "face_location": (int(x), int(y), int(w), int(h)),
+                    "similarity": round(best_similarity, 4) if best_similarity > 0 else 0,
+                    "margin": margin,
+                    "candidates": candidates
+                })
+        
+        return results
+    
+    def recognize_face(self, image_path: str, threshold: float = None, top_k: int = 3):
+        """Mengenali wajah dari file gambar"""
+        image = cv2.imread(image_path)
+        if image is None:
+            return {"success": False, "message": "Gambar tidak valid"}
+        return self.recognize_face_image(image, threshold=threshold, top_k=top_k)
+    
+    def recognize_face_image(self, image, threshold: float = None, top_k: int = 3):
+        """
+        Mengenali wajah dari gambar yang sudah di-decode (ndarray) atau bytes
+        threshold None = threshold default backend aktif
+        """
         try:
-            # Baca gambar
-            image = cv2.imread(image_path)
+            image = self.decode_image(image)
             if image is None:
                 return {"success": False, "message": "Gambar tidak valid"}
             
@@ -213,54 +538,19 @@ class SimpleFaceRecognition:
                     "faces_detected": 0
                 }
             
-            results = []
+            results = self.recognize_regions(image, gray, faces, threshold=threshold, top_k=top_k)
             
-            for (x, y, w, h) in faces:
-                # Crop wajah
-                face_roi = image[y:y+h, x:x+w]
-                
-                # Ekstrak fitur
-                features = self.extract_face_features(face_roi)
-                
-                if features is None:
-                    results.append({
+            if results is None:
+                return {
+                    "success": False,
+                    "results": [{
                         "success": False,
                         "message": "Gagal mengekstrak fitur",
                         "face_location": (int(x), int(y), int(w), int(h))
-                    })
-                    continue
-                
-                # Bandingkan dengan semua wajah yang dikenal
-                best_match = None
-                best_similarity = 0
-                
-                for face_id, known_features in self.face_encodings.items():
-                    similarity = self.compare_faces(features, known_features)
-                    
-                    if similarity > best_similarity:
-                        best_similarity = similarity
-                        best_match = face_id
-                
-                # Check threshold
-                if best_match and best_similarity >= threshold:
-                    face_data = self.known_faces.get(best_match, {})
-                    
-                    results.append({
-                        "success": True,
-                        "name": face_data.get("name", "Unknown"),
-                        "nim": face_data.get("nim", "unknown"),
-                        "confidence": round(best_similarity * 100, 2),
-                        "face_location": (int(x), int(y), int(w), int(h)),
-                        "similarity": round(best_similarity, 4),
-                        "face_id": best_match
-                    })
-                else:
-                    results.append({
-                        "success": False,
-                        "message": "Wajah tidak dikenali",
-                        "face_location": (int(x), int(y), int(w), int(h)),
-                        "similarity": round(best_similarity, 4) if best_similarity > 0 else 0
-                    })
+                    } for (x, y, w, h) in faces],
+                    "faces_detected": len(faces),
+                    "recognized_count": 0
+                }
             
             # Check if any face was recognized
             recognized = any(r.get('success', False) for r in results)
@@ -284,25 +574,37 @@ class SimpleFaceRecognition:
     
     def remove_face(self, nim: str):
         """Hapus wajah dari sistem"""
+        if self.read_only:
+            return {"success": False, "message": "Face system read-only"}
         try:
-            faces_to_remove = []
-            
-            for face_id, face_data in self.known_faces.items():
-                if face_data.get("nim") == nim:
-                    faces_to_remove.append(face_id)
-            
-            for face_id in faces_to_remove:
-                self.known_faces.pop(face_id, None)
-                self.face_encodings.pop(face_id, None)
+            with self._lock, self.store.batch():
+                faces_to_remove = []
+                
+                for face_id, face_data in self.known_faces.items():
+                    if face_data.get("nim") == nim:
+                        faces_to_remove.append(face_id)
                 
-                # Hapus folder dataset
-                dataset_path = f"dataset/{face_id}"
-                if os.path.exists(dataset_path):
-                    import shutil
-                    shutil.rmtree(dataset_path)
+                for face_id in faces_to_remove:
+                    self.known_faces.pop(face_id, None)
+                    self.face_encodings.pop(face_id, None)
+                    self.gallery.remove(face_id)
+                    self.store.append_remove(face_id)
+                    
+                    # Hapus folder dataset
+                    dataset_path = f"dataset/{face_id}"
+                    if os.path.exists(dataset_path):
+                        import shutil
+                        shutil.rmtree(dataset_path)
+                
+                if self.lbph is not None and faces_to_remove:
+                    # LBPH tidak bisa menghapus label: latih ulang dari dataset.
+                    # Biaya retrain sudah O(galeri), jadi model langsung disimpan
+                    # supaya restart tidak perlu latih ulang lagi
+                    self.lbph.retrain(self._dataset_samples(self.known_faces))
+                    self._lbph_synced_at = time.time()
+                    self.lbph.save()
             
-            # Save model
-            self.save_model()
+            self._maybe_compact()
             
             return {
                 "success": True,
@@ -313,5 +615,5 @@ class SimpleFaceRecognition:
         except Exception as e:
             return {"success": False, "message": f"Error: {str(e)}"}
 
-# Global instance
-face_system = SimpleFaceRecognition()
\ No newline at end of file
+# Global instance (read-only di worker proses, lihat workers.get_cpu_pool)
+face_system = SimpleFaceRecognition(read_only=settings.READ_ONLY)
\ No newline at end of file
@@ -0,0 +1,337 @@
+# gallery_index.py - Matriks galeri wajah untuk pencocokan cepat
+import numpy as np
+
+
+class GalleryIndex:
+    """
+    Galeri wajah dalam bentuk satu matriks contiguous.
+    Setiap baris sudah dinormalisasi (panjang 1), jadi cosine similarity
+    cukup dihitung dengan satu perkalian matriks-vektor.
+    Opsional: `ann` (IVFIndex) untuk pencarian approximate di galeri besar.
+
+    dtype penyimpanan:
+    - "float32": default, skor langsung exact
+    - "float16": 2x lebih hemat dari float32
+    - "int8"   : 4x lebih hemat, dengan satu skala float32 per baris
+    Untuk float16/int8, `rerank` kandidat teratas dihitung ulang secara exact
+    memakai `rerank_source(face_id)` (vektor fitur asli).
+    float16 menukar latency dengan RAM: numpy tidak punya BLAS float16, jadi
+    setiap blok diubah dulu ke float32 dan konversi float16 -> float32 lambat.
+    Exact search galeri 20k x 512 sekitar 4x lebih lambat dari float32
+    (perkalian float16 langsung lebih lambat lagi). Konversi int8 murah, jadi
+    int8 lebih kecil sekaligus secepat float32; float16 hanya berguna jika
+    presisi int8 tidak cukup, atau dipakai bersama ANN (hanya kandidat diubah).
+
+    rebuild() bersifat lazy: matriks baru dibangun saat galeri pertama kali
+    dipakai, jadi startup tidak perlu membaca seluruh snapshot. Jika snapshot
+    menyimpan matriks index (GalleryStore.index) dengan dtype yang sama,
+    memmap itu langsung dipakai sebagai matriks tanpa dibangun ulang.
+    """
+
+    DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+    def __init__(self, capacity: int = 64, ann=None, dtype: str = "float32",
+                 rerank: int = 32, rerank_source=None, block: int = 256):
+        if dtype not in self.DTYPES:
+            raise ValueError(f"dtype galeri tidak dikenal: {dtype}")
+
+        self.ids = []  # face_id, paralel dengan baris matriks
+        self._rows = {}  # {face_id: index baris}
+        self._matrix = None
+        self._scales = None  # skala per baris (khusus int8)
+        self._capacity = capacity
+        self.ann = ann
+        self.dtype = dtype
+        self.rerank = rerank
+        self.rerank_source = rerank_source
+        self.block = block
+        self._pending = None  # encodings yang belum dibangun jadi matriks
+
+    def __len__(self):
+        self._materialize()
+        return len(self.ids)
+
+    def __contains__(self, face_id):
+        self._materialize()
+        return face_id in self._rows
+
+    @property
+    def quantized(self):
+        return self.dtype != "float32"
+
+    @property
+    def matrix(self):
+        """View matriks yang terisi saja (tanpa sisa kapasitas)"""
+        self._materialize()
+        if self._matrix is None:
+            return np.zeros((0, 0), dtype=self.DTYPES[self.dtype])
+        return self._matrix[:len(self.ids)]
+
+    @property
+    def nbytes(self):
+        """Memori yang dipakai matriks galeri (termasuk skala int8)"""
+        total = self.matrix.nbytes
+        if self._scales is not None:
+            total += self._scales[:len(self.ids)].nbytes
+        return total
+
+    @staticmethod
+    def normalize(features):
+        """Normalisasi vektor / matriks fitur ke float32 dengan panjang 1"""
+        arr = np.asarray(features, dtype=np.float32)
+        norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return arr / norms
+
+    def encode(self, features):
+        """Fitur mentah -> (baris dtype penyimpanan, skala int8 atau None)"""
+        return self._quantize(self.normalize(features))
+
+    def _quantize(self, vectors):
+        """Ubah vektor ternormalisasi ke dtype penyimpanan. Return (data, skala)"""
+        if self.dtype == "int8":
+            peak = np.abs(vectors).max(axis=-1, keepdims=True)
+            scales = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+            data = np.round(vectors / scales).astype(np.int8)
+            return data, scales[..., 0]
+        return vectors.astype(self.DTYPES[self.dtype]), None
+
+    def _ensure_capacity(self, dim):
+        storage = self.DTYPES[self.dtype]
+        if self._matrix is None:
+            self._matrix = np.zeros((self._capacity, dim), dtype=storage)
+            if self.dtype == "int8":
+                self._scales = np.ones(self._capacity, dtype=np.float32)
+        elif len(self.ids) >= self._matrix.shape[0]:
+            # Kapasitas digandakan supaya penambahan tetap amortized O(1)
+            size = len(self.ids)
+            grown = np.zeros((self._matrix.shape[0] * 2, dim), dtype=storage)
+            grown[:size] = self._matrix[:size]
+            self._matrix = grown
+            if self._scales is not None:
+                scales = np.ones(grown.shape[0], dtype=np.float32)
+                scales[:size] = self._scales[:size]
+                self._scales = scales
+
+    def _store(self, row, vec):
+        data, scale = self._quantize(vec)
+        self._matrix[row] = data
+        if scale is not None:
+            self._scales[row] = scale
+
+    def take(self, rows):
+        """Ambil baris galeri sebagai float32 (dekuantisasi jika perlu)"""
+        self._materialize()
+        block = self._matrix[rows].astype(np.float32, copy=False)
+        if self._scales is not None:
+            block = block * self._scales[rows][..., None]
+        return block
+
+    def _take_rows(self, rows):
+        """Seperti take(), tanpa _materialize: aman dipanggil dari thread training IVF"""
+        matrix, scales = self._matrix, self._scales
+        block = matrix[rows].astype(np.float32, copy=False)
+        if scales is not None:
+            block = block * scales[rows][..., None]
+        return block
+
+    def score_rows(self, rows, probes):
+        """Skor similarity baris tertentu terhadap probe (d,) atau (d, m)"""
+        self._materialize()
+        scores = self._matrix[rows].astype(np.float32, copy=False) @ probes
+        if self._scales is not None:
+            scales = self._scales[rows]
+            scores = scores * (scales if scores.ndim == 1 else scales[:, None])
+        return scores
+
+    def _all_scores(self, probes):
+        """
+        Skor seluruh galeri. Galeri quantized dihitung per blok agar salinan
+        float32 sementara tetap kecil (untuk float16 konversi inilah yang lambat)
+        """
+        n = len(self.ids)
+        if not self.quantized:
+            return self.score_rows(slice(0, n), probes)
+
+        scores = np.empty((n,) + probes.shape[1:], dtype=np.float32)
+        for start in range(0, n, self.block):
+            stop = min(start + self.block, n)
+            scores[start:stop] = self.score_rows(slice(start, stop), probes)
+        return scores
+
+    def add(self, face_id, features):
+        """Tambah (atau ganti) satu wajah ke galeri"""
+        self._materialize()
+        vec = self.normalize(features)
+
+        if face_id in self._rows:
+            row = self._rows[face_id]
+            self._store(row, vec)
+            if self.ann is not None:
+                self.ann.add(row, vec)
+            return
+
+        self._ensure_capacity(vec.shape[0])
+        row = len(self.ids)
+        self._store(row, vec)
+        self._rows[face_id] = row
+        self.ids.append(face_id)
+
+        if self.ann is not None:
+            self.ann.add(row, vec)
+            self.ann.maybe_train(self._take_rows, len(self.ids))
+
+    def remove(self, face_id):
+        """Hapus wajah; baris terakhir dipindah ke posisi yang kosong"""
+        self._materialize()
+        row = self._rows.pop(face_id, None)
+        if row is None:
+            return False
+
+        last = len(self.ids) - 1
+        if row != last:
+            moved_id = self.ids[last]
+            self._matrix[row] = self._matrix[last]
+            if self._scales is not None:
+                self._scales[row] = self._scales[last]
+            self.ids[row] = moved_id
+            self._rows[moved_id] = row
+            if self.ann is not None:
+                self.ann.move(last, row)
+        elif self.ann is not None:
+            self.ann.remove(row)
+
+        self.ids.pop()
+        return True
+
+    def rebuild(self, encodings: dict, index: dict = None):
+        """
+        Bangun ulang galeri dari dict {face_id: features} (ditunda sampai dipakai).
+        `index` opsional: matriks index dari snapshot (lihat GalleryStore.index).
+        """
+        self.ids = []
+        self._rows = {}
+        self._matrix = None
+        self._scales = None
+        if self.ann is not None:
+            self.ann.reset()
+        self._pending = (encodings, index)
+
+    def _materialize(self):
+        if self._pending is None:
+            return
+        (encodings, index), self._pending = self._pending, None
+        self._build(encodings, index)
+
+    def _build(self, encodings: dict, index: dict = None):
+        self.ids = []
+        self._rows = {}
+        self._matrix = None
+        self._scales = None
+        if self.ann is not None:
+            self.ann.reset()
+
+        if not encodings:
+            return
+
+        if index is not None and index['dtype'] == self.dtype:
+            self._attach(encodings, index)
+        else:
+            ids = list(encodings.keys())
+            matrix, scales = self.encode(np.stack([encodings[i] for i in ids]))
+            self._matrix = np.ascontiguousarray(matrix)
+            self._scales = scales
+            self.ids = ids
+            self._rows = {face_id: row for row, face_id in enumerate(ids)}
+
+        if self.ann is not None:
+            self.ann.maybe_train(self._take_rows, len(self.ids))
+
+    def _attach(self, encodings, index):
+        """Pakai memmap index snapshot, lalu susulkan perubahan dari journal"""
+        self._matrix = index['matrix']
+        self._scales = index['scales']
+        self.ids = list(index['ids'])
+        self._rows = {face_id: row for row, face_id in enumerate(self.ids)}
+
+        for face_id in index['changed']:
+            if face_id in encodings:
+                self.add(face_id, encodings[face_id])
+            else:
+                self.remove(face_id)
+
+    def _use_ann(self, exact):
+        if exact or self.ann is None:
+            return False
+        # Pasang centroid yang selesai dilatih di background; selama training
+        # pencarian memakai centroid lama atau exact search
+        self.ann.maybe_train(self._take_rows, len(self.ids))
+        return self.ann.should_search(len(self.ids))
+
+    def _top(self, rows, scores, probe, top_k):
+        """
+        Ambil top-k dari skor tahap pertama. Untuk galeri quantized,
+        shortlist sebesar `rerank` dihitung ulang dengan fitur asli.
+        """
+        shortlist = top_k
+        if self.quantized and self.rerank_source is not None:
+            shortlist = max(top_k, self.rerank)
+
+        k = min(shortlist, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        matches = [(self.ids[rows[i]], float(scores[i])) for i in top]
+
+        if shortlist > top_k:
+            matches = [(face_id, self._exact_score(face_id, probe)) for face_id, _ in matches]
+
+        matches.sort(key=lambda m: -m[1])
+        return matches[:top_k]
+
+    def _exact_score(self, face_id, probe):
+        original = np.asarray(self.rerank_source(face_id), dtype=np.float64)
+        norm = np.linalg.norm(original)
+        if norm == 0:
+            return 0.0
+        return float(np.dot(original, probe) / norm)
+
+    def search(self, features, top_k: int = 1, exact: bool = False, nprobe: int = None):
+        """
+        Cari top-k wajah paling mirip dengan satu probe.
+        Return list of (face_id, similarity) terurut dari yang paling mirip.
+        exact=True memaksa pencarian penuh walaupun ANN aktif.
+        """
+        self._materialize()
+        if len(self.ids) == 0:
+            return []
+
+        probe = self.normalize(features)
+
+        if self._use_ann(exact):
+            rows, scores = self.ann.search(self.score_rows, len(self.ids), probe, nprobe=nprobe)
+            if len(rows) >= top_k:
+                return self._top(rows, scores, probe, top_k)
+
+        scores = self._all_scores(probe)
+        return self._top(np.arange(len(scores)), scores, probe, top_k)
+
+    def search_batch(self, probes, top_k: int = 1, exact: bool = False):
+        """
+        Cari top-k untuk banyak probe sekaligus (misalnya foto satu kelas).
+        Semua probe dicocokkan dengan satu perkalian matriks-matriks.
+        """
+        self._materialize()
+        probes = np.atleast_2d(probes)
+        if len(self.ids) == 0:
+            return [[] for _ in range(len(probes))]
+
+        if self._use_ann(exact):
+            return [self.search(p, top_k=top_k) for p in probes]
+
+        normalized = self.normalize(probes)
+        scores = self._all_scores(normalized.T)
+        rows = np.arange(scores.shape[0])
+
+        return [
+            self._top(rows, scores[:, i], normalized[i], top_k)
+            for i in range(len(normalized))
+        ]
@@ -0,0 +1,381 @@
+# gallery_store.py - Penyimpanan galeri: snapshot + journal append-only
+import glob
+import json
+import os
+import pickle
+import struct
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+
+# Header tiap record journal: panjang payload + crc32 payload
+_HEADER = struct.Struct("<II")
+
+
+class GalleryStore:
+    """
+    Persistensi galeri wajah tanpa menulis ulang seluruh model.
+
+    - snapshot: matriks fitur mentah (.npy, float32) + manifest JSON berisi
+      urutan face_id dan data mahasiswa. Matriks dibuka dengan
+      np.load(mmap_mode='r'), jadi startup tidak men-deserialize seluruh
+      galeri dan beberapa proses bisa berbagi page cache yang sama.
+      Manifest ditulis ke file sementara lalu di-swap secara atomik
+      (os.replace), jadi crash tidak merusak satu-satunya salinan
+    - index   : (opsional) matriks galeri yang sudah dinormalisasi dalam dtype
+      penyimpanan GalleryIndex, plus skala int8. Dibuka copy-on-write
+      (mmap_mode='c') dan langsung dipakai sebagai matriks pencocokan, jadi
+      tiap proses tidak perlu normalisasi/kuantisasi ulang. Disediakan
+      `compact_every` baris cadangan untuk enroll dari journal
+    - journal : record "enroll" / "remove" yang ditambahkan di akhir file.
+      Registrasi satu mahasiswa = satu append (O(1) I/O). Record pertama
+      ("snapshot", generation) menandai snapshot yang menjadi dasar journal
+
+    Saat load, snapshot dibaca lalu journal di-replay. Record terakhir yang
+    terpotong (crash saat menulis) diabaikan, dan baru dibuang dari journal
+    saat pemilik store menulis lagi. Jadi proses lain (worker read-only)
+    aman membaca journal yang sedang ditulis.
+    """
+
+    def __init__(self, snapshot_path: str, journal_path: str = None, compact_every: int = 500,
+                 legacy_path: str = None):
+        self.snapshot_path = snapshot_path  # manifest JSON
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + ".journal"
+        self.legacy_path = legacy_path  # snapshot pickle format lama (dibaca saja)
+        self.generation = 0
+        self.compact_every = compact_every
+        self.journal_records = 0
+        self._journal = None
+        self._batch_depth = 0
+        # Akhir record valid terakhir yang sudah dibaca; hanya berlaku untuk
+        # journal milik `generation` (compaction mengosongkan lalu mengisi ulang)
+        self._journal_offset = 0
+        self._snapshot_stamp = None
+        # Matriks index dari snapshot: {dtype, ids, matrix, scales, changed}
+        self.index = None
+
+    # ---------- load ----------
+
+    def exists(self):
+        return any(
+            path and os.path.exists(path)
+            for path in (self.snapshot_path, self.journal_path, self.legacy_path)
+        )
+
+    @property
+    def is_legacy(self):
+        """True jika yang ada baru snapshot pickle lama (perlu migrasi)"""
+        return not os.path.exists(self.snapshot_path) and bool(
+            self.legacy_path and os.path.exists(self.legacy_path)
+        )
+
+    def load(self):
+        """
+        Return (known_faces, face_encodings) dari snapshot + journal.
+        Nilai face_encodings dari snapshot adalah view baris memmap (read-only).
+        """
+        self._snapshot_stamp = self._stamp(self.snapshot_path)
+        known_faces, face_encodings = self._read_snapshot()
+        self.journal_records = self._replay(known_faces, face_encodings)
+        return known_faces, face_encodings
+
+    @staticmethod
+    def _stamp(path):
+        try:
+            st = os.stat(path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def _journal_size(self):
+        try:
+            return os.path.getsize(self.journal_path)
+        except OSError:
+            return 0
+
+    def read_new_records(self):
+        """
+        Record journal yang ditulis proses lain sejak terakhir dibaca.
+        Return None jika snapshot berganti / journal dipadatkan (perlu load ulang).
+        """
+        if self._stamp(self.snapshot_path) != self._snapshot_stamp:
+            return None
+        size = self._journal_size()
+        if size < self._journal_offset:
+            return None
+        if size == self._journal_offset:
+            return []
+
+        # Compaction bisa terjadi di antara os.stat di atas dan pembacaan:
+        # offset lama hanya valid selama journal masih milik generasi yang sama
+        if self._journal_generation() not in (None, self.generation):
+            return None
+        offset = self._journal_offset
+        records = []
+        for record, end in self._read_records(offset):
+            offset = end
+            if record[0] != "snapshot":
+                records.append(record)
+        if self._journal_generation() not in (None, self.generation):
+            return None
+
+        self._journal_offset = offset
+        self.journal_records += len(records)
+        return records
+
+    def _journal_generation(self):
+        """Generasi snapshot dari header journal (None jika kosong / format lama)"""
+        for record, _ in self._read_records():
+            return record[1] if record[0] == "snapshot" else None
+        return None
+
+    def _matrix_path(self, generation):
+        return f"{os.path.splitext(self.snapshot_path)[0]}.{generation}.npy"
+
+    def _load_array(self, name, mmap_mode='r'):
+        return np.load(os.path.join(os.path.dirname(self.snapshot_path), name), mmap_mode=mmap_mode)
+
+    def _read_snapshot(self):
+        self.index = None
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            self.generation = manifest['generation']
+
+            ids = manifest['ids']
+            if not ids:
+                return manifest['known_faces'], {}
+            matrix = self._load_array(manifest['matrix'])
+
+            index = manifest.get('index')
+            if index:
+                self.index = {
+                    'dtype': index['dtype'],
+                    'ids': list(ids),
+                    'matrix': self._load_array(index['matrix'], mmap_mode='c'),
+                    'scales': self._load_array(index['scales'], mmap_mode='c') if index['scales'] else None,
+                    'changed': set(),  # face_id yang diubah journal setelah snapshot
+                }
+            return manifest['known_faces'], {face_id: matrix[i] for i, face_id in enumerate(ids)}
+
+        if self.is_legacy:
+            with open(self.legacy_path, 'rb') as f:
+                data = pickle.load(f)
+            return data.get('known_faces', {}), data.get('face_encodings', {})
+
+        return {}, {}
+
+    def _read_records(self, start=0):
+        """Yield (record, offset akhir record) sampai record rusak/terpotong"""
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'rb') as f:
+            f.seek(start)
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                length, crc = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                yield pickle.loads(payload), f.tell()
+
+    def _replay(self, known_faces, face_encodings):
+        count = 0
+        self._journal_offset = 0
+        for record, end in self._read_records():
+            self._journal_offset = end
+            if record[0] == "snapshot":
+                continue
+            self.apply(record, known_faces, face_encodings)
+            if self.index is not None:
+                self.index['changed'].add(record[1])
+            count += 1
+        return count
+
+    @staticmethod
+    def apply(record, known_faces, face_encodings):
+        """Terapkan satu record journal ke dict galeri"""
+        op = record[0]
+        if op == "enroll":
+            _, face_id, face_data, features = record
+            known_faces[face_id] = face_data
+            face_encodings[face_id] = features
+        elif op == "remove":
+            _, face_id = record
+            known_faces.pop(face_id, None)
+            face_encodings.pop(face_id, None)
+
+    # ---------- journal ----------
+
+    def _open_journal(self):
+        if self._journal is None:
+            # Buang ekor journal yang rusak supaya append berikutnya tetap valid
+            size = self._journal_size()
+            if size > self._journal_offset:
+                print(f"⚠️ Journal terpotong, {size - self._journal_offset} byte dibuang")
+                with open(self.journal_path, 'r+b') as f:
+                    f.truncate(self._journal_offset)
+            self._journal = open(self.journal_path, 'ab')
+            if self._journal_offset == 0:
+                self._write(("snapshot", self.generation))
+        return self._journal
+
+    def _sync(self):
+        if self._journal is not None:
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+    @contextmanager
+    def batch(self):
+        """Kelompokkan banyak append; fsync hanya sekali di akhir batch"""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._sync()
+
+    def _write(self, record):
+        payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        self._journal.write(_HEADER.pack(len(payload), zlib.crc32(payload)))
+        self._journal.write(payload)
+        self._journal_offset += _HEADER.size + len(payload)
+
+    def append(self, record):
+        self._open_journal()
+        self._write(record)
+        self.journal_records += 1
+
+        if self._batch_depth == 0:
+            self._sync()
+
+    def append_enroll(self, face_id, face_data, features):
+        self.append(("enroll", face_id, face_data, features))
+
+    def append_remove(self, face_id):
+        self.append(("remove", face_id))
+
+    def needs_compaction(self):
+        return self._batch_depth == 0 and self.journal_records >= self.compact_every
+
+    # ---------- snapshot ----------
+
+    def write_snapshot(self, known_faces, face_encodings, gallery=None):
+        """
+        Tulis snapshot baru secara atomik, lalu kosongkan journal.
+        Jika `gallery` (GalleryIndex) diberikan, matriks index-nya ikut ditulis.
+        """
+        generation = self.generation + 1
+        ids = list(face_encodings.keys())
+        matrix_path = self._matrix_path(generation)
+
+        # Matriks ditulis baris per baris langsung ke file (tanpa np.stack di RAM)
+        if ids:
+            dim = len(face_encodings[ids[0]])
+            matrix = np.lib.format.open_memmap(
+                matrix_path, mode='w+', dtype=np.float32, shape=(len(ids), dim)
+            )
+            for i, face_id in enumerate(ids):
+                matrix[i] = face_encodings[face_id]
+            matrix.flush()
+            del matrix
+            with open(matrix_path, 'rb') as f:
+                os.fsync(f.fileno())
+
+        manifest = {
+            'generation': generation,
+            'matrix': os.path.basename(matrix_path),
+            'ids': ids,
+            'known_faces': known_faces
+        }
+        if ids and gallery is not None:
+            manifest['index'] = self._write_index(generation, ids, face_encodings, gallery)
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self._fsync_dir()
+        self.generation = generation
+        self._snapshot_stamp = self._stamp(self.snapshot_path)
+        self._remove_old_matrices()
+
+        # Crash di antara swap dan truncate aman: replay record lama idempotent
+        self._sync()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(0)
+                os.fsync(f.fileno())
+        self.journal_records = 0
+        self._journal_offset = 0
+
+    def _write_index(self, generation, ids, face_encodings, gallery, block: int = 1024):
+        """
+        Tulis baris galeri ternormalisasi (dtype penyimpanan) + skala int8.
+        Baris cadangan (sparse di disk) menampung enroll sampai compaction
+        berikutnya tanpa harus menyalin matriks.
+        """
+        base = os.path.splitext(self.snapshot_path)[0]
+        capacity = len(ids) + self.compact_every
+        dim = len(face_encodings[ids[0]])
+
+        matrix_path = f"{base}.{generation}.index.npy"
+        matrix = np.lib.format.open_memmap(
+            matrix_path, mode='w+', dtype=gallery.DTYPES[gallery.dtype], shape=(capacity, dim)
+        )
+        scales_path = None
+        scales = None
+        if gallery.dtype == "int8":
+            scales_path = f"{base}.{generation}.scales.npy"
+            scales = np.lib.format.open_memmap(
+                scales_path, mode='w+', dtype=np.float32, shape=(capacity,)
+            )
+
+        for start in range(0, len(ids), block):
+            stop = min(start + block, len(ids))
+            data, scale = gallery.encode(np.stack([face_encodings[i] for i in ids[start:stop]]))
+            matrix[start:stop] = data
+            if scales is not None:
+                scales[start:stop] = scale
+
+        for array, path in ((matrix, matrix_path), (scales, scales_path)):
+            if array is None:
+                continue
+            array.flush()
+            with open(path, 'rb') as f:
+                os.fsync(f.fileno())
+        del matrix, scales
+
+        return {
+            'dtype': gallery.dtype,
+            'matrix': os.path.basename(matrix_path),
+            'scales': os.path.basename(scales_path) if scales_path else None,
+        }
+
+    def _remove_old_matrices(self):
+        """Hapus matriks generasi lama (yang masih di-mmap dicoba lagi nanti)"""
+        current = f"{os.path.splitext(self.snapshot_path)[0]}.{self.generation}."
+        for path in glob.glob(f"{os.path.splitext(self.snapshot_path)[0]}.*.npy"):
+            if path.startswith(current):
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # Windows: file masih dipakai memmap proses lain
+
+    def _fsync_dir(self):
+        if not hasattr(os, "O_DIRECTORY"):
+            return  # Windows tidak mendukung fsync direktori
+        fd = os.open(os.path.dirname(os.path.abspath(self.snapshot_path)), os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
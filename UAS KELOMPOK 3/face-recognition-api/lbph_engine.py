@@ -0,0 +1,139 @@
+# lbph_engine.py - Engine recognition LBPH (opencv-contrib) sebagai alternatif cosine
+import json
+import os
+
+import cv2
+import numpy as np
+
+
+class LBPHEngine:
+    """
+    Pembungkus cv2.face.LBPHFaceRecognizer untuk galeri wajah.
+
+    - Setiap face_id dipetakan ke label integer (LBPH hanya mengenal int)
+    - Registrasi memakai update() (incremental), bukan train() ulang
+    - LBPH tidak bisa menghapus satu label, jadi remove() melatih ulang
+      dari crop wajah di dataset/ (jarang terjadi)
+    - Model disimpan ke .yml + peta label .json di folder models/
+
+    Jarak LBPH (chi-square, makin kecil makin mirip) diubah ke similarity
+    0..1 dengan 1 - jarak / max_distance, supaya threshold API tetap sama.
+    """
+
+    def __init__(self, model_path: str = "models/lbph_model.yml", face_size: int = 100,
+                 max_distance: float = 200.0, radius: int = 1, neighbors: int = 8,
+                 grid_x: int = 8, grid_y: int = 8):
+        self.model_path = model_path
+        self.labels_path = os.path.splitext(model_path)[0] + "_labels.json"
+        self.face_size = face_size
+        self.max_distance = max_distance
+        self._params = (radius, neighbors, grid_x, grid_y)
+
+        self.recognizer = cv2.face.LBPHFaceRecognizer_create(*self._params)
+        self.labels = {}  # {face_id: label}
+        self._face_ids = {}  # {label: face_id}
+        self._next_label = 0
+        self.trained = False
+        self.saved_at = None  # mtime file model yang terakhir di-load / disimpan
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __contains__(self, face_id):
+        return face_id in self.labels
+
+    @property
+    def nbytes(self):
+        """Memori histogram LBPH (satu histogram per sampel)"""
+        if not self.trained:
+            return 0
+        return sum(h.nbytes for h in self.recognizer.getHistograms())
+
+    def preprocess(self, gray_roi):
+        return cv2.resize(gray_roi, (self.face_size, self.face_size))
+
+    def _label_for(self, face_id):
+        label = self.labels.get(face_id)
+        if label is None:
+            label = self._next_label
+            self._next_label += 1
+            self.labels[face_id] = label
+            self._face_ids[label] = face_id
+        return label
+
+    # ---------- enroll / remove ----------
+
+    def add(self, face_id, gray_rois):
+        """Tambah satu atau beberapa crop wajah (grayscale) untuk face_id"""
+        if isinstance(gray_rois, np.ndarray):
+            gray_rois = [gray_rois]
+        label = self._label_for(face_id)
+        images = [self.preprocess(roi) for roi in gray_rois]
+        labels = np.full(len(images), label, dtype=np.int32)
+        # update() pada model kosong sama dengan train()
+        self.recognizer.update(images, labels)
+        self.trained = True
+
+    def retrain(self, samples):
+        """
+        Latih ulang dari nol. `samples` = iterable (face_id, crop grayscale).
+        Dipakai saat ada wajah yang dihapus.
+        """
+        self.recognizer = cv2.face.LBPHFaceRecognizer_create(*self._params)
+        self.labels = {}
+        self._face_ids = {}
+        self._next_label = 0
+        self.trained = False
+
+        images, labels = [], []
+        for face_id, roi in samples:
+            images.append(self.preprocess(roi))
+            labels.append(self._label_for(face_id))
+        if images:
+            self.recognizer.train(images, np.array(labels, dtype=np.int32))
+            self.trained = True
+
+    # ---------- predict ----------
+
+    def predict(self, gray_roi):
+        """Return (face_id, similarity 0..1), atau (None, 0.0) jika galeri kosong"""
+        if not self.trained:
+            return None, 0.0
+        label, distance = self.recognizer.predict(self.preprocess(gray_roi))
+        face_id = self._face_ids.get(int(label))
+        if face_id is None:
+            return None, 0.0
+        return face_id, max(0.0, 1.0 - distance / self.max_distance)
+
+    # ---------- persistensi ----------
+
+    def load(self):
+        """Load model .yml + peta label. Return False jika belum ada"""
+        if not (os.path.exists(self.model_path) and os.path.exists(self.labels_path)):
+            return False
+        with open(self.labels_path, 'r', encoding='utf-8') as f:
+            self.labels = json.load(f)
+        self._face_ids = {label: face_id for face_id, label in self.labels.items()}
+        self._next_label = max(self.labels.values(), default=-1) + 1
+        self.recognizer.read(self.model_path)
+        self.trained = bool(self.labels)
+        self.saved_at = os.path.getmtime(self.model_path)
+        return True
+
+    def save(self):
+        """Tulis model ke file sementara lalu swap atomik (seperti snapshot galeri)"""
+        if not self.trained:
+            for path in (self.model_path, self.labels_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            return
+
+        base, ext = os.path.splitext(self.model_path)
+        tmp_model = f"{base}.tmp{ext}"  # ekstensi .yml menentukan format file
+        self.recognizer.write(tmp_model)
+        tmp_labels = self.labels_path + ".tmp"
+        with open(tmp_labels, 'w', encoding='utf-8') as f:
+            json.dump(self.labels, f)
+        os.replace(tmp_model, self.model_path)
+        os.replace(tmp_labels, self.labels_path)
+        self.saved_at = os.path.getmtime(self.model_path)
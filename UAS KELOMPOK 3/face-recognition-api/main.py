@@ -1,19 +1,19 @@
 # main_face_fixed.py - Sistem Face Recognition yang sudah diperbaiki
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 import sqlite3
 import os
+import asyncio
+import json
 import aiofiles
 from datetime import datetime
-import cv2
-import numpy as np
 import base64
-from io import BytesIO
-import tempfile
 
 # Import simple face recognition
 from face_recognition_simple import face_system
+from video_tracking import FaceTracker
+import workers
 
 app = FastAPI(title="Face Recognition Attendance System")
 
@@ -93,8 +93,72 @@ def get_db():
     conn.row_factory = sqlite3.Row
     return conn
 
+@app.on_event("shutdown")
+def shutdown_workers():
+    workers.shutdown()
+
+def record_attendance(nim, name, course, confidence):
+    """Simpan satu record absensi (dijalankan di worker pool)"""
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    now = datetime.now()
+    attendance_date = now.date().isoformat()
+    attendance_time = now.time().strftime('%H:%M:%S')
+    
+    cursor.execute("""
+        INSERT INTO attendance (nim, name, course, attendance_date, attendance_time, confidence)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (nim, name, course, attendance_date, attendance_time, confidence))
+    
+    conn.commit()
+    conn.close()
+    
+    return attendance_date, attendance_time
+
+def register_student_with_face(nim, name, program, image_bytes):
+    """Simpan mahasiswa ke database lalu registrasi wajahnya (dijalankan di worker pool)"""
+    image = face_system.decode_image(image_bytes)
+    
+    if image is None:
+        raise HTTPException(status_code=400, detail="Gambar tidak valid")
+    
+    # Register student in database first
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(
+            "INSERT INTO students (nim, name, program) VALUES (?, ?, ?)",
+            (nim, name, program)
+        )
+        conn.commit()
+    except sqlite3.IntegrityError:
+        conn.close()
+        raise HTTPException(status_code=400, detail=f"NIM {nim} sudah terdaftar")
+    
+    # Register face using face_system
+    register_result = face_system.register_face_image(nim, name, image)
+    
+    if not register_result.get('success'):
+        # Rollback database if face registration fails
+        cursor.execute("DELETE FROM students WHERE nim = ?", (nim,))
+        conn.commit()
+        conn.close()
+        raise HTTPException(status_code=400, detail=register_result.get('message', 'Gagal mendaftarkan wajah'))
+    
+    # Update face_registered status in database
+    cursor.execute(
+        "UPDATE students SET face_registered = 1 WHERE nim = ?",
+        (nim,)
+    )
+    conn.commit()
+    conn.close()
+    
+    return register_result
+
 @app.get("/")
-async def home():
+def home():
     """Homepage"""
     conn = get_db()
     cursor = conn.cursor()
@@ -801,67 +865,24 @@ async def api_register(data: dict):
         if not all([nim, name, photo_base64]):
             raise HTTPException(status_code=400, detail="Data tidak lengkap")
         
-        # Decode base64 image
+        # Decode base64, database dan registrasi wajah dijalankan di worker pool
         image_data = base64.b64decode(photo_base64)
-        nparr = np.frombuffer(image_data, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if image is None:
-            raise HTTPException(status_code=400, detail="Gambar tidak valid")
+        register_result = await workers.run_blocking(
+            register_student_with_face, nim, name, program, image_data
+        )
         
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-            temp_path = temp_file.name
-            cv2.imwrite(temp_path, image)
+        return {
+            "message": f"Mahasiswa {name} berhasil didaftarkan dengan wajah terdaftar",
+            "face_id": register_result.get('face_id')
+        }
         
-        try:
-            # Register student in database first
-            conn = get_db()
-            cursor = conn.cursor()
-            
-            try:
-                cursor.execute(
-                    "INSERT INTO students (nim, name, program) VALUES (?, ?, ?)",
-                    (nim, name, program)
-                )
-                conn.commit()
-            except sqlite3.IntegrityError:
-                raise HTTPException(status_code=400, detail=f"NIM {nim} sudah terdaftar")
-            
-            # Register face using face_system
-            register_result = face_system.register_face(nim, name, temp_path)
-            
-            if not register_result.get('success'):
-                # Rollback database if face registration fails
-                conn.rollback()
-                conn.close()
-                raise HTTPException(status_code=400, detail=register_result.get('message', 'Gagal mendaftarkan wajah'))
-            
-            # Update face_registered status in database
-            cursor.execute(
-                "UPDATE students SET face_registered = 1 WHERE nim = ?",
-                (nim,)
-            )
-            conn.commit()
-            conn.close()
-            
-            return {
-                "message": f"Mahasiswa {name} berhasil didaftarkan dengan wajah terdaftar",
-                "face_id": register_result.get('face_id')
-            }
-            
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-                
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 @app.get("/students")
-async def students_page():
+def students_page():
     """Halaman data mahasiswa"""
     conn = get_db()
     cursor = conn.cursor()
@@ -1196,7 +1217,7 @@ async def students_page():
     """)
 
 @app.get("/api/attendance/{nim}")
-async def get_student_attendance(nim: str):
+def get_student_attendance(nim: str):
     """API untuk mendapatkan riwayat absensi mahasiswa"""
     conn = get_db()
     cursor = conn.cursor()
@@ -1214,7 +1235,7 @@ async def get_student_attendance(nim: str):
     return [dict(row) for row in attendance]
 
 @app.delete("/api/students/{nim}")
-async def delete_student(nim: str):
+def delete_student(nim: str):
     """API untuk menghapus mahasiswa"""
     conn = get_db()
     cursor = conn.cursor()
@@ -1361,6 +1382,7 @@ async def attendance_page():
                 
                 <button id="startCamera" class="btn">🎥 Start Camera</button>
                 <button id="takeAttendance" class="btn" disabled>📷 Ambil Absensi</button>
+                <button id="liveAttendance" class="btn" disabled>🔴 Absensi Live</button>
                 
                 <div id="result" class="result"></div>
             </div>
@@ -1372,8 +1394,11 @@ async def attendance_page():
             const takeAttendanceBtn = document.getElementById('takeAttendance');
             const resultDiv = document.getElementById('result');
             const courseSelect = document.getElementById('courseSelect');
+            const liveAttendanceBtn = document.getElementById('liveAttendance');
             
             let stream = null;
+            let socket = null;
+            let liveTimer = null;
             
             startCameraBtn.addEventListener('click', async () => {
                 try {
@@ -1384,6 +1409,7 @@ async def attendance_page():
                     
                     video.srcObject = stream;
                     takeAttendanceBtn.disabled = false;
+                    liveAttendanceBtn.disabled = false;
                     startCameraBtn.disabled = true;
                     startCameraBtn.textContent = "🎥 Camera Active";
                     resultDiv.style.display = 'none';
@@ -1432,6 +1458,65 @@ async def attendance_page():
                     resultDiv.className = "result error";
                 }
             });
+            
+            // Mode live: kirim frame JPEG (binary) lewat WebSocket
+            function stopLive() {
+                clearInterval(liveTimer);
+                liveTimer = null;
+                if (socket) socket.close();
+                socket = null;
+                liveAttendanceBtn.textContent = "🔴 Absensi Live";
+            }
+            
+            liveAttendanceBtn.addEventListener('click', () => {
+                if (socket) {
+                    stopLive();
+                    return;
+                }
+                
+                const protocol = location.protocol === 'https:' ? 'wss' : 'ws';
+                socket = new WebSocket(`${protocol}://${location.host}/ws/face-attendance?course=${courseSelect.value}`);
+                socket.binaryType = 'arraybuffer';
+                
+                const canvas = document.createElement('canvas');
+                
+                socket.onopen = () => {
+                    liveAttendanceBtn.textContent = "⏹ Stop Live";
+                    resultDiv.textContent = "⏳ Menunggu wajah...";
+                    resultDiv.className = "result";
+                    resultDiv.style.display = 'block';
+                    
+                    liveTimer = setInterval(() => {
+                        // Lewati frame jika frame sebelumnya belum terkirim
+                        if (!socket || socket.readyState !== WebSocket.OPEN || socket.bufferedAmount > 0) return;
+                        canvas.width = video.videoWidth;
+                        canvas.height = video.videoHeight;
+                        canvas.getContext('2d').drawImage(video, 0, 0);
+                        canvas.toBlob(blob => {
+                            if (blob && socket && socket.readyState === WebSocket.OPEN) socket.send(blob);
+                        }, 'image/jpeg', 0.8);
+                    }, 200);
+                };
+                
+                socket.onmessage = (event) => {
+                    const data = JSON.parse(event.data);
+                    if (data.type === 'attendance') {
+                        resultDiv.textContent = `✅ Absensi berhasil! ${data.name} (${data.nim}) telah hadir. Confidence: ${data.confidence}%`;
+                        resultDiv.className = "result success";
+                    } else if (data.type === 'error') {
+                        resultDiv.textContent = "❌ " + data.message;
+                        resultDiv.className = "result error";
+                    }
+                };
+                
+                socket.onclose = () => stopLive();
+            });
+            
+            courseSelect.addEventListener('change', () => {
+                if (socket && socket.readyState === WebSocket.OPEN) {
+                    socket.send(JSON.stringify({ course: courseSelect.value }));
+                }
+            });
         </script>
     </body>
     </html>
@@ -1447,67 +1532,39 @@ async def api_face_attendance(data: dict):
         if not photo_base64:
             raise HTTPException(status_code=400, detail="Foto tidak ditemukan")
         
-        # Decode base64 image
+        # Decode + recognize face di worker pool
         image_data = base64.b64decode(photo_base64)
-        nparr = np.frombuffer(image_data, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        result = await workers.recognize(image_data)
         
-        if image is None:
+        if result is None:
             raise HTTPException(status_code=400, detail="Gambar tidak valid")
         
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-            temp_path = temp_file.name
-            cv2.imwrite(temp_path, image)
+        print(f"Recognition result: {result}")  # Debug log
         
-        try:
-            # Recognize face menggunakan fungsi yang ada
-            result = face_system.recognize_face(temp_path, threshold=0.6)
-            
-            print(f"Recognition result: {result}")  # Debug log
+        if result.get('success') and result.get('recognized_count', 0) > 0:
+            # Ambil hasil pertama yang berhasil
+            for face_result in result.get('results', []):
+                if face_result.get('success'):
+                    nim = face_result.get('nim')
+                    name = face_result.get('name')
+                    confidence = face_result.get('confidence', 0)
+                    
+                    # Record attendance
+                    await workers.run_blocking(record_attendance, nim, name, course, confidence)
+                    
+                    return {
+                        "success": True,
+                        "nim": nim,
+                        "name": name,
+                        "confidence": confidence,
+                        "message": f"Absensi berhasil untuk {name}"
+                    }
             
-            if result.get('success') and result.get('recognized_count', 0) > 0:
-                # Ambil hasil pertama yang berhasil
-                for face_result in result.get('results', []):
-                    if face_result.get('success'):
-                        nim = face_result.get('nim')
-                        name = face_result.get('name')
-                        confidence = face_result.get('confidence', 0)
-                        
-                        # Record attendance
-                        conn = get_db()
-                        cursor = conn.cursor()
-                        
-                        now = datetime.now()
-                        attendance_date = now.date().isoformat()
-                        attendance_time = now.time().strftime('%H:%M:%S')
-                        
-                        cursor.execute("""
-                            INSERT INTO attendance (nim, name, course, attendance_date, attendance_time, confidence)
-                            VALUES (?, ?, ?, ?, ?, ?)
-                        """, (nim, name, course, attendance_date, attendance_time, confidence))
-                        
-                        conn.commit()
-                        conn.close()
-                        
-                        return {
-                            "success": True,
-                            "nim": nim,
-                            "name": name,
-                            "confidence": confidence,
-                            "message": f"Absensi berhasil untuk {name}"
-                        }
-                
-                # Jika tidak ada yang recognized
-                raise HTTPException(status_code=404, detail="Wajah tidak dikenali")
-            else:
-                raise HTTPException(status_code=404, detail=result.get('message', 'Wajah tidak dikenali. Pastikan wajah sudah terdaftar.'))
-                
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-                
+            # Jika tidak ada yang recognized
+            raise HTTPException(status_code=404, detail="Wajah tidak dikenali")
+        else:
+            raise HTTPException(status_code=404, detail=result.get('message', 'Wajah tidak dikenali. Pastikan wajah sudah terdaftar.'))
+        
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -1517,8 +1574,127 @@ async def api_face_attendance(data: dict):
         print(f"Traceback: {error_details}")
         raise HTTPException(status_code=500, detail=f"Error sistem: {str(e)}")
 
+@app.websocket("/ws/face-attendance")
+async def ws_face_attendance(websocket: WebSocket, course: str = "CS101"):
+    """
+    Absensi dari stream kamera kiosk lewat WebSocket
+    - Client mengirim frame JPEG sebagai pesan binary (tanpa base64/JSON)
+    - Hanya frame terbaru yang diproses; frame lama ditimpa (dibuang) jika
+      recognition tertinggal, jadi antrian tidak pernah menumpuk
+    - Pesan text JSON {"course": "..."} untuk ganti mata kuliah
+    - Satu FaceTracker per koneksi: deteksi penuh hanya tiap beberapa frame,
+      recognition hanya untuk wajah baru / yang belum dikenali
+    - Server mengirim event "recognition" per frame dan "attendance" sekali
+      per mahasiswa per sesi. Frame rusak atau error saat recognition
+      dibalas event "error", stream tetap berjalan
+    """
+    await websocket.accept()
+    
+    session = {"course": course, "frame": None, "dropped": 0, "recorded": set()}
+    tracker = FaceTracker(face_system)
+    frame_ready = asyncio.Event()
+    closed = asyncio.Event()
+    
+    async def receive_frames():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes") is not None:
+                    if session["frame"] is not None:
+                        session["dropped"] += 1
+                    session["frame"] = message["bytes"]
+                    frame_ready.set()
+                elif message.get("text"):
+                    try:
+                        control = json.loads(message["text"])
+                        session["course"] = control.get("course", session["course"])
+                    except (ValueError, AttributeError):
+                        pass
+        finally:
+            closed.set()
+            frame_ready.set()
+    
+    receiver = asyncio.create_task(receive_frames())
+    
+    try:
+        while True:
+            await frame_ready.wait()
+            frame_ready.clear()
+            if closed.is_set():
+                break
+            
+            frame, session["frame"] = session["frame"], None
+            if frame is None:
+                continue
+            
+            try:
+                result = await workers.track(tracker, frame)
+            except Exception as e:
+                # Error di worker: laporkan, lalu lanjut ke frame berikutnya
+                if closed.is_set():
+                    break
+                await websocket.send_json({"type": "error", "message": f"Gagal memproses frame: {e}"})
+                continue
+            if closed.is_set():
+                break
+            
+            if result is None:
+                await websocket.send_json({"type": "error", "message": "Gambar tidak valid"})
+                continue
+            
+            faces = []
+            for track in result["tracks"]:
+                faces.append({
+                    "success": track["recognized"],
+                    "nim": track.get('nim'),
+                    "name": track.get('name'),
+                    "confidence": track.get('confidence', 0),
+                    "face_location": track["face_location"],
+                    "track_id": track["track_id"]
+                })
+                
+                nim = track.get('nim')
+                if not track["recognized"] or nim in session["recorded"]:
+                    continue
+                
+                # Record attendance sekali per mahasiswa per sesi
+                session["recorded"].add(nim)
+                try:
+                    attendance_date, attendance_time = await workers.run_blocking(
+                        record_attendance, nim, track['name'],
+                        session["course"], track['confidence']
+                    )
+                except Exception as e:
+                    session["recorded"].discard(nim)  # dicoba lagi di frame berikutnya
+                    await websocket.send_json({"type": "error", "message": f"Gagal mencatat absensi: {e}"})
+                    continue
+                await websocket.send_json({
+                    "type": "attendance",
+                    "nim": nim,
+                    "name": track['name'],
+                    "course": session["course"],
+                    "confidence": track['confidence'],
+                    "date": attendance_date,
+                    "time": attendance_time,
+                    "message": f"Absensi berhasil untuk {track['name']}"
+                })
+            
+            await websocket.send_json({
+                "type": "recognition",
+                "faces_detected": len(result["tracks"]),
+                "detected": result["detected"],
+                "faces": faces,
+                "dropped": session["dropped"]
+            })
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+
 @app.get("/reports")
-async def reports_page():
+def reports_page():
     """Halaman laporan"""
     conn = get_db()
     cursor = conn.cursor()
@@ -1683,7 +1859,7 @@ class StudentUpdate(BaseModel):
 
 # 1. GET ALL STUDENTS (JSON API) - Untuk Postman
 @app.get("/api/students")
-async def get_all_students_api():
+def get_all_students_api():
     """API untuk mendapatkan semua data mahasiswa dalam format JSON (untuk Postman)"""
     conn = get_db()
     cursor = conn.cursor()
@@ -1722,7 +1898,7 @@ async def get_all_students_api():
 
 # 2. GET SINGLE STUDENT BY NIM (JSON API) - Untuk Postman
 @app.get("/api/students/{nim}")
-async def get_student_by_nim_api(nim: str):
+def get_student_by_nim_api(nim: str):
     """API untuk mendapatkan data mahasiswa berdasarkan NIM (untuk Postman)"""
     conn = get_db()
     cursor = conn.cursor()
@@ -1759,7 +1935,7 @@ async def get_student_by_nim_api(nim: str):
 
 # 3. UPDATE STUDENT (PUT) - Untuk Postman
 @app.put("/api/students/{nim}")
-async def update_student_api(nim: str, student_data: StudentUpdate):
+def update_student_api(nim: str, student_data: StudentUpdate):
     """API untuk mengupdate data mahasiswa (untuk Postman)"""
     conn = get_db()
     cursor = conn.cursor()
@@ -1828,66 +2004,23 @@ async def register_student_form(
 ):
     """API untuk registrasi dengan form-data (untuk Postman)"""
     try:
-        # Baca file upload
+        # Baca file upload; decode, database dan registrasi di worker pool
         contents = await foto.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if image is None:
-            raise HTTPException(status_code=400, detail="Gambar tidak valid")
-        
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-            temp_path = temp_file.name
-            cv2.imwrite(temp_path, image)
+        register_result = await workers.run_blocking(
+            register_student_with_face, nim, name, program, contents
+        )
         
-        try:
-            # Register student in database first
-            conn = get_db()
-            cursor = conn.cursor()
-            
-            try:
-                cursor.execute(
-                    "INSERT INTO students (nim, name, program) VALUES (?, ?, ?)",
-                    (nim, name, program)
-                )
-                conn.commit()
-            except sqlite3.IntegrityError:
-                raise HTTPException(status_code=400, detail=f"NIM {nim} sudah terdaftar")
-            
-            # Register face using face_system
-            register_result = face_system.register_face(nim, name, temp_path)
-            
-            if not register_result.get('success'):
-                # Rollback database if face registration fails
-                conn.rollback()
-                conn.close()
-                raise HTTPException(status_code=400, detail=register_result.get('message', 'Gagal mendaftarkan wajah'))
-            
-            # Update face_registered status in database
-            cursor.execute(
-                "UPDATE students SET face_registered = 1 WHERE nim = ?",
-                (nim,)
-            )
-            conn.commit()
-            conn.close()
-            
-            return {
-                "status": "success",
-                "message": f"Mahasiswa {name} berhasil didaftarkan dengan wajah terdaftar",
-                "data": {
-                    "nim": nim,
-                    "name": name,
-                    "program": program,
-                    "face_id": register_result.get('face_id')
-                }
+        return {
+            "status": "success",
+            "message": f"Mahasiswa {name} berhasil didaftarkan dengan wajah terdaftar",
+            "data": {
+                "nim": nim,
+                "name": name,
+                "program": program,
+                "face_id": register_result.get('face_id')
             }
-            
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-                
+        }
+        
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -1903,68 +2036,44 @@ async def face_attendance_form(
     try:
         # Baca file upload
         contents = await image.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        image_cv = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
         
-        if image_cv is None:
-            raise HTTPException(status_code=400, detail="Gambar tidak valid")
+        # Decode + recognize face di worker pool
+        result = await workers.recognize(contents)
         
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-            temp_path = temp_file.name
-            cv2.imwrite(temp_path, image_cv)
+        if result is None:
+            raise HTTPException(status_code=400, detail="Gambar tidak valid")
         
-        try:
-            # Recognize face
-            result = face_system.recognize_face(temp_path, threshold=0.6)
-            
-            if result.get('success') and result.get('recognized_count', 0) > 0:
-                # Ambil hasil pertama
-                for face_result in result.get('results', []):
-                    if face_result.get('success'):
-                        nim = face_result.get('nim')
-                        name = face_result.get('name')
-                        confidence = face_result.get('confidence', 0)
-                        
-                        # Record attendance
-                        conn = get_db()
-                        cursor = conn.cursor()
-                        
-                        now = datetime.now()
-                        attendance_date = now.date().isoformat()
-                        attendance_time = now.time().strftime('%H:%M:%S')
-                        
-                        cursor.execute("""
-                            INSERT INTO attendance (nim, name, course, attendance_date, attendance_time, confidence)
-                            VALUES (?, ?, ?, ?, ?, ?)
-                        """, (nim, name, course, attendance_date, attendance_time, confidence))
-                        
-                        conn.commit()
-                        conn.close()
-                        
-                        return {
-                            "status": "success",
-                            "message": f"Absensi berhasil untuk {name}",
-                            "data": {
-                                "nim": nim,
-                                "name": name,
-                                "confidence": confidence,
-                                "course": course,
-                                "attendance_date": attendance_date,
-                                "attendance_time": attendance_time
-                            }
+        if result.get('success') and result.get('recognized_count', 0) > 0:
+            # Ambil hasil pertama
+            for face_result in result.get('results', []):
+                if face_result.get('success'):
+                    nim = face_result.get('nim')
+                    name = face_result.get('name')
+                    confidence = face_result.get('confidence', 0)
+                    
+                    # Record attendance
+                    attendance_date, attendance_time = await workers.run_blocking(
+                        record_attendance, nim, name, course, confidence
+                    )
+                    
+                    return {
+                        "status": "success",
+                        "message": f"Absensi berhasil untuk {name}",
+                        "data": {
+                            "nim": nim,
+                            "name": name,
+                            "confidence": confidence,
+                            "course": course,
+                            "attendance_date": attendance_date,
+                            "attendance_time": attendance_time
                         }
-                
-                # Jika tidak ada yang recognized
-                raise HTTPException(status_code=404, detail="Wajah tidak dikenali")
-            else:
-                raise HTTPException(status_code=404, detail=result.get('message', 'Wajah tidak dikenali. Pastikan wajah sudah terdaftar.'))
-                
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-                
+                    }
+            
+            # Jika tidak ada yang recognized
+            raise HTTPException(status_code=404, detail="Wajah tidak dikenali")
+        else:
+            raise HTTPException(status_code=404, detail=result.get('message', 'Wajah tidak dikenali. Pastikan wajah sudah terdaftar.'))
+        
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -1972,7 +2081,7 @@ async def face_attendance_form(
 
 # 6. CREATE STUDENT WITHOUT PHOTO (POST) - Untuk testing
 @app.post("/api/students")
-async def create_student_without_photo(
+def create_student_without_photo(
     nim: str = Form(...),
     name: str = Form(...),
     program: str = Form("")
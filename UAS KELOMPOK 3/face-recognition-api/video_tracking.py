@@ -0,0 +1,296 @@
+# video_tracking.py - Absensi dari stream video (kamera kelas) dengan face tracking
+# Contoh: python video_tracking.py --source 0 --show
+import argparse
+import time
+
+import cv2
+
+from config import settings
+
+
+def box_iou(a, b):
+    """Intersection over union dua kotak (x, y, w, h)"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+class FaceTrack:
+    """Satu wajah yang diikuti dari frame ke frame"""
+
+    def __init__(self, track_id: int, box, gray):
+        self.track_id = track_id
+        self.box = tuple(int(v) for v in box)
+        self.template = None
+        self.score = 1.0  # skor template matching terakhir
+        self.missed = 0  # deteksi berturut-turut tanpa kotak yang cocok
+        self.identity = None  # hasil recognize_regions terakhir
+        self.last_recognized = None  # nomor frame recognition terakhir
+        self.needs_recognition = True
+        self.set_template(gray)
+
+    def set_template(self, gray):
+        x, y, w, h = self.box
+        self.template = gray[y:y+h, x:x+w].copy()
+
+    @property
+    def recognized(self):
+        return bool(self.identity and self.identity.get('success'))
+
+    def to_dict(self):
+        x, y, w, h = self.box
+        data = {
+            "track_id": self.track_id,
+            "face_location": (x, y, w, h),
+            "recognized": self.recognized,
+            "track_score": round(float(self.score), 4)
+        }
+        if self.recognized:
+            data.update({
+                "name": self.identity["name"],
+                "nim": self.identity["nim"],
+                "confidence": self.identity["confidence"],
+                "face_id": self.identity["face_id"]
+            })
+        return data
+
+
+class FaceTracker:
+    """
+    Lapisan tracking di atas SimpleFaceRecognition untuk stream video.
+
+    - Deteksi Haar penuh hanya tiap `detect_every` frame
+    - Di antara deteksi, kotak wajah diikuti dengan template matching
+      di sekitar posisi sebelumnya (murah, hanya area kecil)
+    - Ekstraksi fitur + pencocokan galeri hanya untuk track baru, track yang
+      skor tracking-nya turun (mungkin berganti orang), atau track yang belum
+      dikenali (dicoba ulang tiap `recheck_every` frame)
+
+    Jadi stream 15 fps tidak berarti 15 siklus deteksi + pencocokan per detik.
+    """
+
+    def __init__(self, system=None, threshold: float = None, detect_every: int = None,
+                 track_min_score: float = None, recheck_every: int = None,
+                 max_missed: int = None, search_margin: float = 0.5, iou_threshold: float = 0.3):
+        if system is None:
+            from face_recognition_simple import face_system
+            system = face_system
+
+        self.system = system
+        self.threshold = threshold
+        self.detect_every = detect_every or settings.VIDEO_DETECT_EVERY
+        self.track_min_score = track_min_score if track_min_score is not None else settings.VIDEO_TRACK_MIN_SCORE
+        self.recheck_every = recheck_every or settings.VIDEO_RECHECK_EVERY
+        self.max_missed = max_missed if max_missed is not None else settings.VIDEO_MAX_MISSED
+        self.search_margin = search_margin  # area pencarian = kotak + margin * ukuran kotak
+        self.iou_threshold = iou_threshold
+
+        self.tracks = []
+        self.frame_index = 0
+        self._next_id = 1
+        self._force_detect = True
+        self.stats = {"frames": 0, "detections": 0, "recognitions": 0}
+
+    def reset(self):
+        self.tracks = []
+        self.frame_index = 0
+        self._force_detect = True
+
+    # ---------- tracking ----------
+
+    def _follow(self, track, gray):
+        """Cari template track di sekitar posisi lama. Return False jika hilang"""
+        x, y, w, h = track.box
+        height, width = gray.shape[:2]
+        mx, my = int(w * self.search_margin), int(h * self.search_margin)
+        x0, y0 = max(0, x - mx), max(0, y - my)
+        x1, y1 = min(width, x + w + mx), min(height, y + h + my)
+
+        window = gray[y0:y1, x0:x1]
+        th, tw = track.template.shape[:2]
+        if window.shape[0] < th or window.shape[1] < tw:
+            track.score = 0.0
+            return False
+
+        result = cv2.matchTemplate(window, track.template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (bx, by) = cv2.minMaxLoc(result)
+        track.score = score
+        if score < self.track_min_score:
+            return False
+
+        track.box = (x0 + bx, y0 + by, tw, th)
+        return True
+
+    def _associate(self, faces, gray):
+        """Pasangkan kotak hasil deteksi dengan track yang ada (greedy IoU)"""
+        pairs = sorted(
+            ((box_iou(track.box, face), t, f)
+             for t, track in enumerate(self.tracks)
+             for f, face in enumerate(faces)),
+            reverse=True
+        )
+
+        used_tracks, used_faces = set(), set()
+        for iou, t, f in pairs:
+            if iou < self.iou_threshold:
+                break
+            if t in used_tracks or f in used_faces:
+                continue
+            used_tracks.add(t)
+            used_faces.add(f)
+
+            track = self.tracks[t]
+            if track.score < self.track_min_score:
+                # Tracker sempat kehilangan wajah: pastikan masih orang yang sama
+                track.needs_recognition = True
+            track.box = tuple(int(v) for v in faces[f])
+            track.set_template(gray)
+            track.score = 1.0
+            track.missed = 0
+
+        survivors = []
+        for t, track in enumerate(self.tracks):
+            if t not in used_tracks:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    continue
+            survivors.append(track)
+
+        for f, face in enumerate(faces):
+            if f not in used_faces:
+                survivors.append(FaceTrack(self._next_id, face, gray))
+                self._next_id += 1
+
+        self.tracks = survivors
+
+    # ---------- recognition ----------
+
+    def _due_for_recognition(self, track):
+        if track.needs_recognition:
+            return True
+        if not track.recognized and track.score >= self.track_min_score:
+            return self.frame_index - track.last_recognized >= self.recheck_every
+        return False
+
+    def _recognize(self, frame, gray):
+        """Recognition sekali jalan (batch) untuk track yang membutuhkan saja"""
+        pending = [t for t in self.tracks if self._due_for_recognition(t)]
+        if not pending:
+            return []
+
+        results = self.system.recognize_regions(
+            frame, gray, [t.box for t in pending], threshold=self.threshold, top_k=1
+        )
+        if results is None:
+            return []
+        self.stats["recognitions"] += len(pending)
+
+        events = []
+        for track, result in zip(pending, results):
+            previous = track.identity.get('face_id') if track.recognized else None
+            track.identity = result
+            track.last_recognized = self.frame_index
+            track.needs_recognition = False
+            if track.recognized and track.identity['face_id'] != previous:
+                events.append({"event": "recognized", **track.to_dict()})
+        return events
+
+    # ---------- main loop ----------
+
+    def process_frame(self, frame):
+        """
+        Proses satu frame BGR.
+        Return dict: track aktif, event wajah yang baru dikenali, dan apakah
+        frame ini memakai deteksi penuh
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        detect = self._force_detect or not self.tracks or self.frame_index % self.detect_every == 0
+
+        if detect:
+            faces, _ = self.system.detect_faces(frame)
+            self._associate(list(faces), gray)
+            self._force_detect = False
+            self.stats["detections"] += 1
+        else:
+            lost = [t for t in self.tracks if not self._follow(t, gray)]
+            if lost:
+                # Track hilang / skor turun: deteksi penuh di frame berikutnya
+                self._force_detect = True
+
+        events = self._recognize(frame, gray)
+
+        result = {
+            "frame": self.frame_index,
+            "detected": detect,
+            "tracks": [t.to_dict() for t in self.tracks],
+            "events": events
+        }
+        self.frame_index += 1
+        self.stats["frames"] += 1
+        return result
+
+
+def run_camera(source, threshold: float = None, show: bool = False):
+    """Loop kamera / file video; cetak setiap wajah yang baru dikenali"""
+    from face_recognition_simple import face_system
+
+    # Proses ini hanya membaca galeri; registrasi baru diikuti lewat journal
+    face_system.read_only = True
+    tracker = FaceTracker(face_system, threshold=threshold)
+
+    capture = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not capture.isOpened():
+        print(f"❌ Tidak bisa membuka sumber video: {source}")
+        return
+
+    seen = set()
+    start = time.perf_counter()
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+
+            if tracker.frame_index % tracker.detect_every == 0:
+                face_system.refresh_model()
+            result = tracker.process_frame(frame)
+
+            for event in result["events"]:
+                status = "" if event["nim"] not in seen else " (sudah tercatat)"
+                seen.add(event["nim"])
+                print(f"✅ {event['name']} ({event['nim']}) - {event['confidence']}%{status}")
+
+            if show:
+                for track in result["tracks"]:
+                    x, y, w, h = track["face_location"]
+                    color = (0, 255, 0) if track["recognized"] else (0, 0, 255)
+                    label = track.get("name", f"#{track['track_id']}")
+                    cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+                    cv2.putText(frame, label, (x, max(0, y - 8)),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+                cv2.imshow("Face Attendance", frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+    finally:
+        capture.release()
+        if show:
+            cv2.destroyAllWindows()
+
+    elapsed = time.perf_counter() - start
+    stats = tracker.stats
+    print(f"📊 {stats['frames']} frame ({stats['frames'] / max(elapsed, 1e-9):.1f} fps), "
+          f"{stats['detections']} deteksi, {stats['recognitions']} recognition, "
+          f"{len(seen)} mahasiswa dikenali")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Absensi wajah dari kamera / file video")
+    parser.add_argument("--source", default="0", help="Index kamera atau path file video")
+    parser.add_argument("--threshold", type=float, default=None, help="Default: threshold backend")
+    parser.add_argument("--show", action="store_true", help="Tampilkan jendela preview")
+    args = parser.parse_args()
+    run_camera(args.source, threshold=args.threshold, show=args.show)
@@ -0,0 +1,122 @@
+# workers.py - Worker pool untuk pekerjaan berat (recognition, decode, database)
+# Handler async di main.py memanggil fungsi di sini supaya event loop tetap responsif
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import cv2
+
+from config import settings
+
+_io_pool = None  # thread pool: database & registrasi (mengubah galeri di proses utama)
+_cpu_pool = None  # thread / process pool: decode gambar + recognition
+
+
+def configure_opencv():
+    """
+    Batasi thread internal OpenCV. Dengan N worker yang masing-masing memakai
+    semua core, CPU jadi oversubscribed; lebih cepat 1 thread per worker.
+    """
+    cv2.setNumThreads(settings.OPENCV_THREADS)
+
+
+def _init_process_worker():
+    configure_opencv()
+    # Worker proses hanya membaca galeri; perubahan diikuti lewat refresh_model().
+    # Dengan spawn, face_system dibuat read-only sejak konstruktor (FACE_READ_ONLY);
+    # dengan fork, objek warisan proses utama ditandai di sini
+    from face_recognition_simple import face_system
+    face_system.read_only = True
+
+
+def get_io_pool():
+    global _io_pool
+    if _io_pool is None:
+        _io_pool = ThreadPoolExecutor(
+            max_workers=settings.WORKER_POOL_SIZE,
+            thread_name_prefix="io-worker"
+        )
+    return _io_pool
+
+
+def get_cpu_pool():
+    global _cpu_pool
+    if _cpu_pool is None:
+        if settings.WORKER_POOL_TYPE == "process":
+            # Diwarisi worker sebelum import face_recognition_simple: konstruktor
+            # face_system di worker tidak memigrasi model lama / menulis snapshot.
+            # Proses utama tidak terpengaruh karena settings sudah dibaca saat import
+            os.environ["FACE_READ_ONLY"] = "True"
+            _cpu_pool = ProcessPoolExecutor(
+                max_workers=settings.WORKER_POOL_SIZE,
+                initializer=_init_process_worker
+            )
+        else:
+            _cpu_pool = ThreadPoolExecutor(
+                max_workers=settings.WORKER_POOL_SIZE,
+                thread_name_prefix="cpu-worker"
+            )
+    return _cpu_pool
+
+
+def shutdown():
+    global _io_pool, _cpu_pool
+    for pool in (_cpu_pool, _io_pool):
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+    _io_pool = _cpu_pool = None
+
+
+def recognize_bytes(image_bytes, threshold: float = None, top_k: int = 3):
+    """
+    Decode + recognition (berjalan di dalam worker)
+    Return None jika gambar tidak bisa di-decode
+    """
+    from face_recognition_simple import face_system
+
+    image = face_system.decode_image(image_bytes)
+    if image is None:
+        return None
+    if face_system.read_only:
+        face_system.refresh_model()
+    return face_system.recognize_face_image(image, threshold=threshold, top_k=top_k)
+
+
+def track_bytes(tracker, image_bytes):
+    """
+    Decode + FaceTracker.process_frame (berjalan di thread worker)
+    Return None jika gambar tidak bisa di-decode
+    """
+    image = tracker.system.decode_image(image_bytes)
+    if image is None:
+        return None
+    return tracker.process_frame(image)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Jalankan fungsi sinkron (sqlite3, registrasi) di thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_pool(), functools.partial(func, *args, **kwargs))
+
+
+async def recognize(image_bytes, threshold: float = None, top_k: int = 3):
+    """Recognition dari bytes gambar di worker pool (thread atau process)"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_cpu_pool(),
+        functools.partial(recognize_bytes, image_bytes, threshold, top_k)
+    )
+
+
+async def track(tracker, image_bytes):
+    """
+    Satu frame stream lewat FaceTracker milik koneksi. State tracker ada di
+    proses utama, jadi dengan process pool dijalankan di thread pool I/O
+    """
+    pool = get_io_pool() if settings.WORKER_POOL_TYPE == "process" else get_cpu_pool()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, functools.partial(track_bytes, tracker, image_bytes))
+
+
+configure_opencv()